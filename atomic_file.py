@@ -0,0 +1,26 @@
+import contextlib
+import os
+import tempfile
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="wb", **kwargs):
+    """Open a temporary file that replaces ``path`` once the block completes.
+
+    The file is created next to ``path``, synced to disk and renamed over
+    it, so ``path`` is never seen half written. If the block raises, the
+    temporary file is removed and ``path`` is left as it was. Extra
+    arguments are passed to ``open``.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,159 @@
+import asyncio
+import os
+from collections import OrderedDict
+
+import aiohttp
+from PIL import Image
+
+
+class AvatarFetcher:
+    """Downloads avatars without blocking the event loop.
+
+    All requests share one aiohttp session, so connections to the Discord
+    CDN are kept alive between joins. Each download has its own timeout and
+    at most ``max_concurrency`` run at once, so a join wave can't open
+    hundreds of sockets.
+    """
+
+    def __init__(self, max_concurrency=8, timeout=5.0, pool_size=16, avatar_size=256):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.avatar_size = avatar_size
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def fetch(self, url):
+        """Return the bytes at ``url``, or None if the download fails or times out"""
+        session = self._get_session()
+        async with self._semaphore:
+            try:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        print(f"Error fetching avatar {url}: HTTP {response.status}")
+                        return None
+                    return await response.read()
+            except asyncio.TimeoutError:
+                print(f"Timed out fetching avatar {url}")
+            except aiohttp.ClientError as e:
+                print(f"Error fetching avatar {url}: {e}")
+        return None
+
+    async def fetch_avatar(self, member):
+        """Return (asset_key, bytes) for the member's avatar, falling back to their default avatar.
+
+        The key identifies which image was actually downloaded so it can be
+        used as a cache key; bytes is None if nothing could be fetched.
+        """
+        if member.avatar:
+            data = await self.fetch(member.avatar.with_size(self.avatar_size).url)
+            if data:
+                return member.avatar.key, data
+        return avatar_key(member.default_avatar), await self.fetch(member.default_avatar.url)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+def avatar_key(asset):
+    """Cache key for an avatar asset (the avatar hash, or the default avatar index)"""
+    if asset.key.isdigit():
+        return f"default-{asset.key}"
+    return asset.key
+
+
+class AvatarCache:
+    """LRU cache of decoded, already-resized avatar tiles keyed by avatar hash.
+
+    Tiles are PIL images. The in-memory tier is bounded by the total size
+    of the pixel data; least recently used tiles are dropped first. If
+    ``disk_dir`` is set, tiles are also written there as PNG so a restart
+    doesn't have to download them again.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._tiles = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def _tile_size(tile):
+        return tile.width * tile.height * len(tile.getbands())
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.png")
+
+    def _load_from_disk(self, key):
+        try:
+            with Image.open(self._disk_path(key)) as tile:
+                tile.load()
+                return tile.copy()
+        except (OSError, ValueError):
+            return None
+
+    def _remember(self, key, tile):
+        if key in self._tiles:
+            self.size_bytes -= self._tile_size(self._tiles.pop(key))
+        self._tiles[key] = tile
+        self.size_bytes += self._tile_size(tile)
+
+        while self.size_bytes > self.max_bytes and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self.size_bytes -= self._tile_size(evicted)
+            self.evictions += 1
+
+    async def get(self, key):
+        """Return the cached tile for ``key`` or None"""
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+        if self.disk_dir:
+            tile = await asyncio.to_thread(self._load_from_disk, key)
+            if tile is not None:
+                self.disk_hits += 1
+                self._remember(key, tile)
+                return tile
+
+        self.misses += 1
+        return None
+
+    async def put(self, key, tile):
+        self._remember(key, tile)
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(tile.save, self._disk_path(key), format="PNG")
+            except OSError as e:
+                print(f"Error writing avatar cache file for {key}: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._tiles),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
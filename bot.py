@@ -4,47 +4,152 @@ from discord.ui import Button, View, Modal, TextInput
 import asyncio
 import datetime
 import os
-import json
-from io import BytesIO, StringIO
-from PIL import Image, ImageDraw, ImageFont
-import requests
+from io import BytesIO
 from dotenv import load_dotenv
-import csv
+import atexit
+import contextlib
+import tempfile
+import time
+import typing
+from config_store import ConfigStore
+from storage import Storage
+from avatars import AvatarCache, AvatarFetcher, avatar_key
+from welcome import JoinCoalescer, WelcomeRenderer
+from dm_dispatch import DmDispatcher
+from progress import ProgressReporter
+from timers import PHASE_RUNNING, TimerScheduler, timer_embed
+from reaction_roles import CHANNEL_SELECT, ORGANISATEUR, PARTICIPANT, ReactionRoleTable, RoleMutationQueue
+from conversations import ConversationRouter
+from role_index import RoleIndex
+from ticket_pool import TicketChannelPool
+from ticket_reaper import TicketReaper
+from transcripts import TRANSCRIPT_FORMATS, write_transcript
+from shard_health import ShardHealth
+from stats import format_duration, histogram_quantile, latency_bands
+from exports import EXPORT_FORMATS, parse_date, write_export
+from cloner import CloneExecutor, ClonePlan, capture_guild, read_snapshot, write_snapshot
+
+STARTED_AT = time.perf_counter()
 
 load_dotenv()  # Load environment variables from .env file
 TOKEN = os.getenv('DISCORD_TOKEN')
 
 # Config functions
+# The config is loaded once and kept in memory; writes are batched and atomic
+config_store = ConfigStore("bot_config.json")
+atexit.register(config_store.flush)  # Don't lose pending changes on shutdown
+
 def load_config():
-    """Load configuration from JSON file"""
-    config_path = "bot_config.json"
-    if os.path.exists(config_path):
-        with open(config_path, 'r') as f:
-            return json.load(f)
-    return {}  # Return empty dict if file doesn't exist
-
-def save_config(config):
-    """Save configuration to JSON file"""
-    config_path = "bot_config.json"
-    with open(config_path, 'w') as f:
-        json.dump(config, f, indent=4)
+    """Return the in-memory configuration"""
+    return config_store.data
+
+def guild_config(guild_id):
+    """Return a guild's own settings (welcome channel, selectors, tickets...)"""
+    return config_store.guild(guild_id)
+
+def save_config(config=None):
+    """Schedule a write of the configuration to the JSON file"""
+    if config is not None and config is not config_store.data:
+        config_store.data.clear()
+        config_store.data.update(config)
+    config_store.save()
+
+# Registrations and tickets live in SQLite instead of the config file
+storage = Storage("bot_data.db")
+if storage.migrate_from_config(config_store.data):
+    config_store.save()
+atexit.register(storage.flush_registrations)  # Commit registrations still queued
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Shared HTTP pool for avatar downloads (welcome images)
+avatar_fetcher = AvatarFetcher(max_concurrency=8, timeout=5.0)
 
-@bot.event
-async def on_ready():
-    print(f'Bot is ready as {bot.user}')
+# Decoded avatar tiles, optionally persisted to disk:
+# "avatar_cache": {"max_mb": 32, "disk_dir": "avatar_cache"}
+avatar_cache_config = config_store.data.get("avatar_cache", {})
+avatar_cache = AvatarCache(
+    max_bytes=int(avatar_cache_config.get("max_mb", 32) * 1024 * 1024),
+    disk_dir=avatar_cache_config.get("disk_dir")
+)
+
+# Welcome images are rendered in a worker pool, configurable in bot_config.json:
+# "welcome_renderer": {"mode": "thread" | "process", "workers": 4, "max_pending": 64}
+renderer_config = config_store.data.get("welcome_renderer", {})
+welcome_renderer = WelcomeRenderer(
+    mode=renderer_config.get("mode", "thread"),
+    workers=renderer_config.get("workers"),
+    max_pending=renderer_config.get("max_pending", 64)
+)
+
+# Mass DM sender: "massdm": {"concurrency": 5, "rate": 2.0, "max_rate": 10.0}
+massdm_config = config_store.data.get("massdm", {})
+dm_dispatcher = DmDispatcher(
+    concurrency=massdm_config.get("concurrency", 5),
+    rate=massdm_config.get("rate", 2.0),
+    max_rate=massdm_config.get("max_rate", 10.0)
+)
+
+# One process can serve many guilds; with "sharding": {"enabled": true, "shard_count": null}
+# the gateway connection is split into shards (shard_count null lets Discord decide)
+sharding_config = config_store.data.get("sharding", {})
+BotBase = commands.AutoShardedBot if sharding_config.get("enabled") else commands.Bot
+
+class DataBountyBot(BotBase):
+    async def close(self):
+        # Release pooled HTTP connections before the loop shuts down
+        await avatar_fetcher.close()
+        welcome_renderer.shutdown()
+        await super().close()
+
+bot_options = {}
+if sharding_config.get("enabled") and sharding_config.get("shard_count"):
+    bot_options["shard_count"] = int(sharding_config["shard_count"])
+bot = DataBountyBot(command_prefix='!', intents=intents, **bot_options)
+
+# All countdown timers run from one scheduler loop and survive restarts
+timer_scheduler = TimerScheduler(bot, storage)
+
+# Closed ticket channels are deleted from a durable queue, and old closed tickets
+# are moved to compressed archives:
+# "ticket_cleanup": {"delete_after": 10, "archive_after_days": 30, "archive_dir": "archives",
+#                    "transcript_format": "jsonl" | "html" | "none", "transcript_dir": "transcripts"}
+cleanup_config = config_store.data.get("ticket_cleanup", {})
+
+def ticket_delete_after():
+    """Seconds between closing a ticket and deleting its channel"""
+    return load_config().get("ticket_cleanup", {}).get("delete_after", 10)
+
+async def save_ticket_transcript(channel, job):
+    """Runs before a closed ticket's channel is deleted"""
+    settings = load_config().get("ticket_cleanup", {})
+    fmt = settings.get("transcript_format", "jsonl")
+    if fmt == "none":
+        return
+    if fmt not in TRANSCRIPT_FORMATS:
+        print(f"Unknown ticket_cleanup transcript_format `{fmt}`, saving the transcript as jsonl")
+        fmt = "jsonl"
+    ticket_id = job["ticket_id"]
+    basename = f"ticket-{ticket_id:04d}_{channel.id}" if ticket_id is not None else f"channel_{channel.id}"
+    path, count = await write_transcript(channel, settings.get("transcript_dir", "transcripts"), basename, fmt=fmt)
+    print(f"Saved transcript of #{channel.name} ({count} messages) to {path}")
 
-# ...existing code...
+ticket_reaper = TicketReaper(
+    bot,
+    storage,
+    before_delete=save_ticket_transcript,
+    archive_dir=cleanup_config.get("archive_dir", "archives"),
+    archive_after_days=cleanup_config.get("archive_after_days", 30)
+)
 
 @bot.command()
 @commands.has_permissions(administrator=True)
-async def clone_server(ctx, source_guild_id: int, target_guild_id: int):
+async def clone_server(ctx, source_guild_id: int, target_guild_id: int, dry_run: bool = False):
+    """Copy roles, categories and channels from one server to another.
+    Pass `yes` as the third argument to only show the plan and its estimated duration."""
     # Get source and target guilds
     source_guild = bot.get_guild(source_guild_id)
     target_guild = bot.get_guild(target_guild_id)
@@ -53,177 +158,210 @@ async def clone_server(ctx, source_guild_id: int, target_guild_id: int):
         await ctx.send("Could not find one or both servers.")
         return
 
-    # Clone roles
-    roles = list(source_guild.roles)  # Convert to list
-    roles.reverse() # To create roles in correct order
-    role_mapping = {}
+    # Phase 1: snapshot the source and work out what has to be created, in order
+    plan = ClonePlan(capture_guild(source_guild))
+    if dry_run:
+        await ctx.send(f"```\n{plan.describe()[:1900]}\n```")
+        return
+
+    # Phase 2: create everything, in parallel where the dependencies allow
+    status_message = await ctx.send("Cloning server...")
+    async with ProgressReporter(status_message, "Cloning server", total=plan.total) as progress:
+        executor = CloneExecutor(plan, target_guild, concurrency=5, progress=progress)
+        await executor.run()
+
+    for error in executor.errors[:10]:
+        await ctx.send(error)
+    if len(executor.errors) > 10:
+        await ctx.send(f"...and {len(executor.errors) - 10} more errors.")
+
+    await ctx.send(f"Server clone completed! Created {executor.created} of {plan.total} objects.")
+
+SNAPSHOT_DIR = "snapshots"
+
+def is_guild_admin(guild, user):
+    """Whether the user is an administrator of ``guild``, not only of the server the command ran in"""
+    member = guild.get_member(user.id)
+    return member is not None and member.guild_permissions.administrator
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def snapshot_guild(ctx, guild_id: int = None):
+    """Save this server's (or another server's) roles, categories and channels to a compressed snapshot file"""
+    guild = bot.get_guild(guild_id) if guild_id else ctx.guild
+    if not guild:
+        await ctx.send("Could not find that server.")
+        return
+    if not is_guild_admin(guild, ctx.author):
+        await ctx.send("You need to be an administrator of that server to snapshot it.")
+        return
     
-    # ...rest of the code remains the same...
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    filename = f"{guild.id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl.gz"
+    path = os.path.join(SNAPSHOT_DIR, filename)
+    count = write_snapshot(guild, path)
     
-    for role in roles:
-        if role.name != "@everyone":
-            try:
-                new_role = await target_guild.create_role(
-                    name=role.name,
-                    permissions=role.permissions,
-                    color=role.color,
-                    hoist=role.hoist,
-                    mentionable=role.mentionable
-                )
-                role_mapping[role.id] = new_role.id
-                await asyncio.sleep(1)
-            except discord.Forbidden:
-                await ctx.send(f"Could not create role {role.name}")
+    message = f"Saved a snapshot of {guild.name} ({count} objects) as `{filename}`."
+    if os.path.getsize(path) <= ctx.guild.filesize_limit:
+        await ctx.send(message, file=discord.File(path, filename=filename))
+    else:
+        await ctx.send(message + " It is too large to upload here.")
 
-    # Clone categories and channels
-    for category in source_guild.categories:
-        try:
-            new_category = await target_guild.create_category(
-                name=category.name,
-                overwrites=category.overwrites
-            )
-            
-            for channel in category.channels:
-                if isinstance(channel, discord.TextChannel):
-                    await target_guild.create_text_channel(
-                        name=channel.name,
-                        category=new_category,
-                        topic=channel.topic,
-                        slowmode_delay=channel.slowmode_delay,
-                        nsfw=channel.nsfw,
-                        position=channel.position
-                    )
-                elif isinstance(channel, discord.VoiceChannel):
-                    await target_guild.create_voice_channel(
-                        name=channel.name,
-                        category=new_category,
-                        bitrate=channel.bitrate,
-                        user_limit=channel.user_limit,
-                        position=channel.position
-                    )
-            await asyncio.sleep(1)
-        except discord.Forbidden:
-            await ctx.send(f"Could not create category {category.name}")
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def restore_guild(ctx, filename: str = None):
+    """Restore a snapshot into this server. Attach the file or give the name of a saved snapshot.
+    Only objects that are missing or different are created or updated."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    if ctx.message.attachments:
+        attachment = ctx.message.attachments[0]
+        path = os.path.join(SNAPSHOT_DIR, f"upload_{attachment.id}.jsonl.gz")
+        await attachment.save(path)
+    elif filename:
+        # Only files from the snapshot folder can be restored
+        path = os.path.join(SNAPSHOT_DIR, os.path.basename(filename))
+    else:
+        await ctx.send("Attach a snapshot file or give the name of a saved snapshot.")
+        return
+    
+    try:
+        snapshot = read_snapshot(path)
+        plan = ClonePlan(snapshot)
+    except (OSError, ValueError) as e:
+        await ctx.send(f"Could not read snapshot: {e}")
+        return
+    # Saved snapshots may belong to other servers the bot is in
+    if not ctx.message.attachments and snapshot["guild"]["id"] != ctx.guild.id:
+        source_guild = bot.get_guild(snapshot["guild"]["id"])
+        if source_guild is None or not is_guild_admin(source_guild, ctx.author):
+            await ctx.send("That snapshot belongs to another server you are not an administrator of.")
+            return
+    
+    status_message = await ctx.send("Restoring snapshot...")
+    async with ProgressReporter(status_message, "Restoring snapshot", total=plan.total) as progress:
+        executor = CloneExecutor(plan, ctx.guild, concurrency=5, progress=progress, incremental=True)
+        await executor.run()
+    
+    for error in executor.errors[:10]:
+        await ctx.send(error)
+    if len(executor.errors) > 10:
+        await ctx.send(f"...and {len(executor.errors) - 10} more errors.")
+    
+    await ctx.send(
+        f"Restore of {plan.source_name} completed! Created {executor.created}, updated {executor.updated}, "
+        f"{executor.unchanged} already up to date."
+    )
 
-    # Clone channels without category
-    for channel in source_guild.channels:
-        if not channel.category:
-            try:
-                if isinstance(channel, discord.TextChannel):
-                    await target_guild.create_text_channel(name=channel.name)
-                elif isinstance(channel, discord.VoiceChannel):
-                    await target_guild.create_voice_channel(name=channel.name)
-                await asyncio.sleep(1)
-            except discord.Forbidden:
-                await ctx.send(f"Could not create channel {channel.name}")
-
-    await ctx.send("Server clone completed!")
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def massdm(ctx, *, message):
     """Send a DM to all members in the server. Only usable by administrators."""
-    sent = 0
-    failed = 0
-    
     # Inform that the process is starting
     await ctx.send(f"Starting to send messages to all members in {ctx.guild.name}.")
     
     # Progress message
     status_message = await ctx.send("Sending messages... 0% complete")
     
-    total_members = len(ctx.guild.members)
-    
-    for i, member in enumerate(ctx.guild.members):
-        # Skip bots
-        if member.bot:
-            continue
-            
-        try:
-            await member.send(f"Message from {ctx.guild.name} :\n{message}")
-            sent += 1
-            
-            # Update progress every 10 members or so
-            if i % 10 == 0 or i == total_members - 1:
-                await status_message.edit(content=f"Sending messages... {round((i+1)/total_members*100)}% complete")
-                
-        except (discord.Forbidden, discord.HTTPException):
-            failed += 1
-        
-        # Rate limiting to avoid hitting Discord's rate limits
-        await asyncio.sleep(1)
+    content = f"Message from {ctx.guild.name} :\n{message}"
+    async with ProgressReporter(status_message, "Sending messages") as progress:
+        stats = await dm_dispatcher.run(
+            ctx.guild.members,
+            content,
+            on_progress=lambda stats: progress.update(done=stats.done, total=stats.total, errors=stats.failed)
+        )
+        progress.update(done=stats.done, total=stats.total, errors=stats.failed)
     
-    await ctx.send(f"Mass DM complete. Successfully sent to {sent} members. Failed to send to {failed} members.")
+    await ctx.send(
+        f"Mass DM complete. Successfully sent to {stats.sent} members. Failed to send to {stats.failed} members. "
+        f"Skipped {stats.skipped} bots or members who can't receive DMs. "
+        f"({stats.elapsed:.0f}s, {stats.throughput:.1f} msg/s, {stats.rate_limited} rate limits)"
+    )
 
 
 @bot.event
 async def on_member_join(member):
     """Send a welcome message with custom image when a member joins"""
-    # Load config to get welcome channel
-    config = load_config()
-    welcome_channel_id = config.get("welcome_channel")
+    # Each guild has its own welcome channel
+    welcome_channel_id = config_store.guild_get(member.guild.id, "welcome_channel")
     
     if not welcome_channel_id:
         return  # No welcome channel configured
         
-    welcome_channel = member.guild.get_channel(int(welcome_channel_id))
+    # Joins arriving close together are welcomed in one message
+    welcome_coalescer.add(member.guild.id, member)
+
+async def send_welcome_batch(guild_id, members):
+    """Send one welcome message for a batch of members who just joined"""
+    guild = members[0].guild
+    welcome_channel_id = config_store.guild_get(guild_id, "welcome_channel")
+    if not welcome_channel_id:
+        return
+    
+    welcome_channel = guild.get_channel(int(welcome_channel_id))
     if not welcome_channel:
         return
     
-    # Create welcome image
-    img = await create_welcome_image(member)
+    # Single joins get the normal welcome card
+    if len(members) == 1:
+        member = members[0]
+        img = await create_welcome_image(member)
+        file = discord.File(fp=img, filename="welcome.png")
+        await welcome_channel.send(f"Welcome to the server, {member.mention}!", file=file)
+        return
     
-    # Send the welcome message with the image
-    file = discord.File(fp=img, filename="welcome.png")
-    await welcome_channel.send(f"Welcome to the server, {member.mention}!", file=file)
+    # Several joins: one grid image and one mention list
+    tiles = await asyncio.gather(*(get_avatar_tile(member) for member in members))
+    png = await welcome_renderer.render_collage(
+        guild.id, guild.name, [(member.name, tile) for member, tile in zip(members, tiles)]
+    )
+    file = discord.File(fp=BytesIO(png), filename="welcome.png")
+    mentions = ", ".join(member.mention for member in members)
+    await welcome_channel.send(f"Welcome to the server, {mentions}!", file=file)
+
+# Batching of welcome messages, configurable in bot_config.json:
+# "welcome_batching": {"window": 2.0, "max_batch": 25} (window 0 sends every join on its own)
+batching_config = config_store.data.get("welcome_batching", {})
+welcome_coalescer = JoinCoalescer(
+    send_welcome_batch,
+    window=batching_config.get("window", 2.0),
+    max_batch=min(batching_config.get("max_batch", 25), 50)  # Keep the mention list under the message limit
+)
 
 async def create_welcome_image(member):
     """Create a custom welcome image"""
-    # Load the background image
-    background_path = "welcome_background.png"  # Save your background image with this name
-    
-    try:
-        img = Image.open(background_path)
-    except FileNotFoundError:
-        # Create a simple background if image doesn't exist
-        img = Image.new('RGB', (800, 300), color=(54, 57, 63))
-    
-    draw = ImageDraw.Draw(img)
-    
-    # Try to load fonts - use default if not available
-    try:
-        title_font = ImageFont.truetype("/fonts/RobotoSlab-Regular.ttf", 55)
-        subtitle_font = ImageFont.truetype("arial.ttf", 40)
-    except IOError:
-        title_font = ImageFont.load_default()
-        subtitle_font = ImageFont.load_default()
-    
-    # Adjusted positions - moved text even lower on the image
-    draw.text((350, 220), f"Welcome to {member.guild.name}", fill=(0, 0, 0), font=title_font, anchor="mm")
-    draw.text((295, 290), f"{member.name}", fill=(43, 117, 156), font=subtitle_font, anchor="mm")
-    # Try to add user avatar
-    try:
-        # Get avatar URL and download
-        avatar_url = member.avatar.url if member.avatar else member.default_avatar.url
-        response = requests.get(avatar_url)
-        avatar = Image.open(BytesIO(response.content))
-        avatar = avatar.resize((200, 200))
-        
-        # Make avatar circular
-        mask = Image.new('L', avatar.size, 0)
-        draw_mask = ImageDraw.Draw(mask)
-        draw_mask.ellipse((0, 0, 200, 200), fill=255)
-        
-        # Position avatar on right side
-        img.paste(avatar, (740, 150), mask)
-    except Exception as e:
-        print(f"Error adding avatar: {e}")
-    
-    # Save to buffer
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    
-    return buffer
+    # Get the avatar, then render in the worker pool so the event loop stays free
+    avatar_tile = await get_avatar_tile(member)
+    png = await welcome_renderer.render(member.guild.id, member.guild.name, member.name, avatar_tile)
+    return BytesIO(png)
+
+async def get_avatar_tile(member):
+    """Return the member's resized avatar, downloading it only on a cache miss"""
+    tile = await avatar_cache.get(avatar_key(member.avatar or member.default_avatar))
+    if tile is not None:
+        return tile
+    
+    key, avatar_bytes = await avatar_fetcher.fetch_avatar(member)
+    if avatar_bytes is None:
+        return None
+    
+    tile = await welcome_renderer.prepare_avatar(avatar_bytes)
+    if tile is not None:
+        await avatar_cache.put(key, tile)
+    return tile
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def welcome_stats(ctx):
+    """Show welcome image render timings and avatar cache counters"""
+    render = welcome_renderer.stats()
+    cache = avatar_cache.stats()
+    await ctx.send(
+        f"**Renderer** ({render['mode']}): {render['rendered']} rendered, "
+        f"avg {render['average_ms']} ms, max {render['max_ms']} ms\n"
+        f"**Avatar cache**: {cache['entries']} tiles, {cache['size_bytes'] // 1024} / {cache['max_bytes'] // 1024} KiB, "
+        f"{cache['hits']} hits, {cache['disk_hits']} disk hits, {cache['misses']} misses, "
+        f"{cache['evictions']} evictions (hit rate {cache['hit_rate']:.0%})"
+    )
 
 # Add command to setup welcome channel
 @bot.command()
@@ -233,15 +371,11 @@ async def setup_welcome(ctx, channel: discord.TextChannel = None):
     if not channel:
         channel = ctx.channel
     
-    config = load_config()
-    config["welcome_channel"] = channel.id
-    save_config(config)
+    guild_config(ctx.guild.id)["welcome_channel"] = channel.id
+    save_config()
     
     await ctx.send(f"Welcome channel set to {channel.mention}!")
 
-    # Add this import if it's not already there
-import typing
-
 # Role Selection System
 @bot.command()
 @commands.has_permissions(administrator=True)
@@ -250,12 +384,6 @@ async def setup_role_selection(ctx, channel: discord.TextChannel = None):
     if not channel:
         channel = ctx.channel
     
-    config = load_config()
-    
-    # Initialize role selector configuration
-    if "role_selector" not in config:
-        config["role_selector"] = {}
-    
     # Create embed
     embed = discord.Embed(
         title="Select Your Role",
@@ -278,160 +406,170 @@ async def setup_role_selection(ctx, channel: discord.TextChannel = None):
     await message.add_reaction("🔴")  # For Organisateur
     
     # Store message info in config
-    config["role_selector"]["message_id"] = message.id
-    config["role_selector"]["channel_id"] = channel.id
+    selector = {
+        "message_id": message.id,
+        "channel_id": channel.id
+    }
     
     # Find or create the roles
-    participant_role = discord.utils.get(ctx.guild.roles, name="Participant")
-    if not participant_role:
-        participant_role = await ctx.guild.create_role(
-            name="Participant",
-            color=discord.Color.blue(),
-            reason="Auto-created for role selection"
-        )
+    participant_role, _ = await role_index.get_or_create(
+        ctx.guild,
+        "Participant",
+        color=discord.Color.blue(),
+        reason="Auto-created for role selection"
+    )
         
-    organisateur_role = discord.utils.get(ctx.guild.roles, name="Organisateur")
-    if not organisateur_role:
-        organisateur_role = await ctx.guild.create_role(
-            name="Organisateur",
-            color=discord.Color.red(),
-            reason="Auto-created for role selection"
-        )
+    organisateur_role, _ = await role_index.get_or_create(
+        ctx.guild,
+        "Organisateur",
+        color=discord.Color.red(),
+        reason="Auto-created for role selection"
+    )
     
-    # Store role IDs in config
-    config["role_selector"]["participant_role_id"] = participant_role.id
-    config["role_selector"]["organisateur_role_id"] = organisateur_role.id
-    save_config(config)
+    # Store role IDs in config; earlier selector messages keep working
+    selector["participant_role_id"] = participant_role.id
+    selector["organisateur_role_id"] = organisateur_role.id
+    guild_config(ctx.guild.id).setdefault("role_selectors", []).append(selector)
+    save_config()
     
     await ctx.send(f"Role selection message created and pinned in {channel.mention}!")
 
+# Role lookups by name, kept current from role events
+role_index = RoleIndex()
+
+@bot.listen('on_guild_role_create')
+async def index_role_create(role):
+    role_index.role_created(role)
+
+@bot.listen('on_guild_role_update')
+async def index_role_update(before, after):
+    role_index.role_updated(before, after)
+
+@bot.listen('on_guild_role_delete')
+async def index_role_delete(role):
+    role_index.role_deleted(role)
+
+@bot.listen('on_guild_remove')
+async def index_guild_remove(guild):
+    role_index.invalidate(guild.id)
+
+# Spare ticket channels, "ticket_pool": {"size": 3} in bot_config.json
+ticket_pool = TicketChannelPool(storage)
+
+# (guild_id, user_id) of tickets whose channel is still being set up
+tickets_opening = set()
+config_store.add_listener(ticket_pool.configure)
+
+@bot.listen('on_guild_channel_delete')
+async def forget_spare_channel(channel):
+    ticket_pool.forget(channel.id, channel.guild.id)
+
 # Add handlers for the role selection reactions
+# (message_id, emoji) -> action, rebuilt whenever the config changes
+reaction_roles = ReactionRoleTable()
+config_store.add_listener(reaction_roles.rebuild)
+
+# Quick toggles are merged into one role edit per member:
+# "role_batching": {"window": 1.5}
+role_mutations = RoleMutationQueue(window=config_store.data.get("role_batching", {}).get("window", 1.5))
+
+# DM replies are routed by user ID; pending prompts survive restarts:
+# "conversations": {"timeout": 300}
+conversations = ConversationRouter(storage, default_timeout=config_store.data.get("conversations", {}).get("timeout", 300))
+
 @bot.event
 async def on_raw_reaction_add(payload):
     """Handle reaction adds for both channel selector and role selection"""
-    # Ignore bot reactions
-    if payload.member.bot:
+    # Reactions on any other message stop here
+    action = reaction_roles.lookup(payload.message_id, payload.emoji)
+    if action is None:
         return
     
-    config = load_config()
-    
-    # First check if it's a channel selector reaction
-    channel_selector = config.get("channel_selector", {})
-    if str(payload.message_id) == str(channel_selector.get("message_id")):
-        # Handle channel selection (existing code)
-        emoji_id = str(payload.emoji.id) if payload.emoji.id else payload.emoji.name
-        emoji_role_pairs = channel_selector.get("emoji_role_pairs", {})
-        
-        if emoji_id in emoji_role_pairs:
-            role_id = emoji_role_pairs[emoji_id]["role_id"]
-            guild = bot.get_guild(payload.guild_id)
-            role = guild.get_role(role_id)
-            
-            if role:
-                try:
-                    await payload.member.add_roles(role, reason="Channel selection")
-                    # Get channel object
-                    channel = guild.get_channel(emoji_role_pairs[emoji_id]["channel_id"])
-                    if channel:
-                        try:
-                            await payload.member.send(f"You now have access to the #{channel.name} channel!")
-                        except discord.Forbidden:
-                            pass  # Can't DM user
-                except discord.Forbidden:
-                    print(f"Missing permissions to add role {role.name}")
+    # Ignore bot reactions
+    if payload.member is None or payload.member.bot:
         return
     
-    # Check if it's a role selector reaction
-    role_selector = config.get("role_selector", {})
-    if str(payload.message_id) != str(role_selector.get("message_id")):
+    guild = bot.get_guild(payload.guild_id)
+    role = guild.get_role(action.role_id)
+    if not role:
         return
     
-    guild = bot.get_guild(payload.guild_id)
-    emoji_name = payload.emoji.name
+    if action.kind == CHANNEL_SELECT:
+        # Get channel object
+        channel = guild.get_channel(action.channel_id) if action.channel_id else None
+        role_mutations.add(
+            payload.member, role, "Channel selection",
+            confirmation=f"You now have access to the #{channel.name} channel!" if channel else None
+        )
     
-    # Handle the role selection
-    if emoji_name == "🔵":  # Participant
-        role_id = role_selector.get("participant_role_id")
-        role = guild.get_role(int(role_id))
-        if role:
-            try:
-                await payload.member.add_roles(role, reason="Selected Participant role")
-                try:
-                    await payload.member.send("You have been assigned the Participant role!")
-                except discord.Forbidden:
-                    pass
-            except discord.Forbidden:
-                print("Missing permissions to add Participant role")
+    elif action.kind == PARTICIPANT:
+        role_mutations.add(
+            payload.member, role, "Selected Participant role",
+            confirmation="You have been assigned the Participant role!"
+        )
     
-    elif emoji_name == "🔴":  # Organisateur
-        role_id = role_selector.get("organisateur_role_id")
-        role = guild.get_role(int(role_id))
-        if role:
-            try:
-                await payload.member.add_roles(role, reason="Selected Organisateur role")
-                try:
-                    team_msg = await payload.member.send("You have been assigned the Organisateur role! Please reply with your team name to create or join a team.")
-                    
-                    def check(m):
-                        return m.author.id == payload.user_id and isinstance(m.channel, discord.DMChannel)
-                    
-                    try:
-                        team_response = await bot.wait_for('message', check=check, timeout=10.0)
-                        team_name = team_response.content.strip()
-                        
-                        if team_name:
-                            # Get the guild
-                            guild = bot.get_guild(payload.guild_id)
-                            
-                            # Check if team role exists, create if it doesn't
-                            team_role = discord.utils.get(guild.roles, name=team_name)
-                            if not team_role:
-                                team_role = await guild.create_role(
-                                    name=team_name,
-                                    color=discord.Color.green(),
-                                    reason=f"Team created by {payload.member.name}"
-                                )
-                                await payload.member.send(f"Created new team: {team_name}")
-                            
-                            # Assign the role
-                            await payload.member.add_roles(team_role, reason=f"Joined team {team_name}")
-                            await payload.member.send(f"You have been added to team: {team_name}")
-                    except asyncio.TimeoutError:
-                        await payload.member.send("You didn't provide a team name in time. You can use a command later to join a team.")
-                except discord.Forbidden:
-                    pass
-            except discord.Forbidden:
-                print("Missing permissions to add Organisateur role")
+    elif action.kind == ORGANISATEUR:
+        role_mutations.add(payload.member, role, "Selected Organisateur role")
+        try:
+            await payload.member.send("You have been assigned the Organisateur role! Please reply with your team name to create or join a team.")
+            # The reply is picked up by the conversation router (see on_dm_message)
+            conversations.start(payload.user_id, payload.guild_id, "team_name")
+        except discord.Forbidden:
+            pass
+
+async def team_name_step(conversation, message):
+    """Organisateur flow: the user replied with their team name"""
+    team_name = message.content.strip()
+    if not team_name:
+        await message.channel.send("Please reply with your team name.")
+        return "start"  # Keep waiting
+    
+    guild = bot.get_guild(conversation["guild_id"])
+    member = guild.get_member(message.author.id) if guild else None
+    if not member:
+        return None
+    
+    # Check if team role exists, create if it doesn't
+    try:
+        team_role, created = await role_index.get_or_create(
+            guild,
+            team_name,
+            color=discord.Color.green(),
+            reason=f"Team created by {member.name}"
+        )
+    except discord.Forbidden:
+        await message.channel.send("I don't have permission to create team roles.")
+        return None
+    if created:
+        await message.channel.send(f"Created new team: {team_name}")
+    
+    # Assign the role (merged with the Organisateur role if still pending)
+    role_mutations.add(
+        member, team_role, f"Joined team {team_name}",
+        confirmation=f"You have been added to team: {team_name}"
+    )
+    return None
+
+async def team_name_timeout(conversation):
+    user = bot.get_user(conversation["user_id"])
+    if user:
+        await user.send("You didn't provide a team name in time. You can use a command later to join a team.")
+
+conversations.register("team_name", team_name_step, on_timeout=team_name_timeout)
+
+@bot.listen('on_message')
+async def on_dm_message(message):
+    """Route DM replies to the conversation waiting on that user"""
+    if message.guild is None and not message.author.bot:
+        await conversations.handle_message(message)
 
 # Modify the existing on_raw_reaction_remove to handle both systems
 @bot.event
 async def on_raw_reaction_remove(payload):
     """Handle reaction removes for both channel selector and role selection"""
-    config = load_config()
-    
-    # First check if it's a channel selector reaction
-    channel_selector = config.get("channel_selector", {})
-    if str(payload.message_id) == str(channel_selector.get("message_id")):
-        # Existing channel selection removal code
-        emoji_id = str(payload.emoji.id) if payload.emoji.id else payload.emoji.name
-        emoji_role_pairs = channel_selector.get("emoji_role_pairs", {})
-        
-        if emoji_id in emoji_role_pairs:
-            role_id = emoji_role_pairs[emoji_id]["role_id"]
-            guild = bot.get_guild(payload.guild_id)
-            role = guild.get_role(role_id)
-            member = guild.get_member(payload.user_id)
-            
-            if role and member and not member.bot:
-                try:
-                    await member.remove_roles(role, reason="Channel selection removed")
-                except discord.Forbidden:
-                    print(f"Missing permissions to remove role {role.name}")
-        return
-    
-    # Check if it's a role selector reaction
-    role_selector = config.get("role_selector", {})
-    if str(payload.message_id) != str(role_selector.get("message_id")):
+    # Reactions on any other message stop here
+    action = reaction_roles.lookup(payload.message_id, payload.emoji)
+    if action is None:
         return
     
     guild = bot.get_guild(payload.guild_id)
@@ -439,33 +577,48 @@ async def on_raw_reaction_remove(payload):
     if not member or member.bot:
         return
     
-    emoji_name = payload.emoji.name
+    role = guild.get_role(action.role_id)
+    if not role:
+        return
     
-    # Handle the role removal
-    if emoji_name == "🔵":  # Participant
-        role_id = role_selector.get("participant_role_id")
-        role = guild.get_role(int(role_id))
-        if role:
-            try:
-                await member.remove_roles(role, reason="Removed Participant role")
-            except discord.Forbidden:
-                print("Missing permissions to remove Participant role")
-    
-    elif emoji_name == "🔴":  # Organisateur
-        role_id = role_selector.get("organisateur_role_id")
-        role = guild.get_role(int(role_id))
-        if role:
-            try:
-                await member.remove_roles(role, reason="Removed Organisateur role")
-            except discord.Forbidden:
-                print("Missing permissions to remove Organisateur role")
+    reasons = {
+        CHANNEL_SELECT: "Channel selection removed",
+        PARTICIPANT: "Removed Participant role",
+        ORGANISATEUR: "Removed Organisateur role",
+    }
+    role_mutations.remove(member, role, reasons[action.kind])
             
 # Add these imports at the top if they're not already there
 from discord import Activity, ActivityType, Status
 import datetime
 import asyncio
 import os
-import json
+
+ACTIVITY_TYPES = {
+    "playing": ActivityType.playing,
+    "watching": ActivityType.watching,
+    "listening": ActivityType.listening,
+    "streaming": ActivityType.streaming,
+    "competing": ActivityType.competing
+}
+
+STATUSES = {
+    "online": Status.online,
+    "idle": Status.idle,
+    "dnd": Status.dnd,
+    "invisible": Status.invisible
+}
+
+def saved_presence(config):
+    """Return the (status, activity) saved by set_status / set_activity"""
+    activity = None
+    activity_config = config.get("bot_activity", {})
+    if activity_config:
+        activity = Activity(
+            type=ACTIVITY_TYPES.get(activity_config.get("type", "playing"), ActivityType.playing),
+            name=activity_config.get("text", "")
+        )
+    return STATUSES.get(config.get("bot_status", "online"), Status.online), activity
 
 # Activity commands
 @bot.command()
@@ -475,21 +628,15 @@ async def set_activity(ctx, activity_type, *, text):
     Set the bot's activity status
     Types: playing, watching, listening, streaming, competing
     """
-    activity_types = {
-        "playing": ActivityType.playing,
-        "watching": ActivityType.watching,
-        "listening": ActivityType.listening,
-        "streaming": ActivityType.streaming,
-        "competing": ActivityType.competing
-    }
-    
     activity_type = activity_type.lower()
-    if activity_type not in activity_types:
-        await ctx.send(f"Invalid activity type. Choose from: {', '.join(activity_types.keys())}")
+    if activity_type not in ACTIVITY_TYPES:
+        await ctx.send(f"Invalid activity type. Choose from: {', '.join(ACTIVITY_TYPES.keys())}")
         return
     
-    activity = Activity(type=activity_types[activity_type], name=text)
-    await bot.change_presence(activity=activity)
+    activity = Activity(type=ACTIVITY_TYPES[activity_type], name=text)
+    # Keep the saved status; change_presence would otherwise reset it to online
+    status, _ = saved_presence(load_config())
+    await bot.change_presence(status=status, activity=activity)
     
     # Save to config
     config = load_config()
@@ -505,37 +652,15 @@ async def set_activity(ctx, activity_type, *, text):
 @commands.has_permissions(administrator=True)
 async def set_status(ctx, status):
     """Set bot's status (online, idle, dnd, invisible)"""
-    statuses = {
-        "online": Status.online,
-        "idle": Status.idle,
-        "dnd": Status.dnd,
-        "invisible": Status.invisible
-    }
-    
     status = status.lower()
-    if status not in statuses:
-        await ctx.send(f"Invalid status. Choose from: {', '.join(statuses.keys())}")
+    if status not in STATUSES:
+        await ctx.send(f"Invalid status. Choose from: {', '.join(STATUSES.keys())}")
         return
     
-    # Get current activity if any
+    # Keep the current activity, if any
     config = load_config()
-    activity_config = config.get("bot_activity", {})
-    
-    activity = None
-    if activity_config:
-        activity_types = {
-            "playing": ActivityType.playing,
-            "watching": ActivityType.watching,
-            "listening": ActivityType.listening,
-            "streaming": ActivityType.streaming,
-            "competing": ActivityType.competing
-        }
-        activity = Activity(
-            type=activity_types.get(activity_config.get("type", "playing")), 
-            name=activity_config.get("text", "")
-        )
-    
-    await bot.change_presence(status=statuses[status], activity=activity)
+    _, activity = saved_presence(config)
+    await bot.change_presence(status=STATUSES[status], activity=activity)
     
     # Save to config
     config["bot_status"] = status
@@ -552,95 +677,11 @@ async def timer(ctx, hours: int = 0, minutes: int = 0):
         return
     
     total_seconds = (hours * 3600) + (minutes * 60)
-    end_time = datetime.datetime.now() + datetime.timedelta(seconds=total_seconds)
-    
-    # Create an embed for the timer
-    embed = discord.Embed(
-        title="⏱️ Timer Started",
-        description=f"Time remaining: {hours:02d}:{minutes:02d}:00",
-        color=discord.Color.blue(),
-        timestamp=datetime.datetime.now()
-    )
-    embed.set_footer(text=f"Timer requested by {ctx.author}")
-    
-    # Initial message
-    message = await ctx.send(embed=embed)
-    
-    # Update the timer every second
-    while datetime.datetime.now() < end_time:
-        time_left = end_time - datetime.datetime.now()
-        hours_left = int(time_left.total_seconds() // 3600)
-        minutes_left = int((time_left.total_seconds() % 3600) // 60)
-        seconds_left = int(time_left.total_seconds() % 60)
-        
-        # Update the embed
-        embed.description = f"Time remaining: {hours_left:02d}:{minutes_left:02d}:{seconds_left:02d}"
-        
-        # Update color based on time left (changes to yellow at 25%, red at 10%)
-        percentage_left = time_left.total_seconds() / total_seconds
-        if percentage_left <= 0.1:
-            embed.color = discord.Color.red()
-        elif percentage_left <= 0.25:
-            embed.color = discord.Color.gold()
-        
-        await message.edit(embed=embed)
-        await asyncio.sleep(1)
-    
-    # Timer finished
-    finish_embed = discord.Embed(
-        title="⏰ Time's Up!",
-        description="The timer has ended.",
-        color=discord.Color.red(),
-        timestamp=datetime.datetime.now()
-    )
-    finish_embed.set_footer(text=f"Timer requested by {ctx.author}")
-    
-    await message.edit(embed=finish_embed)
-    await ctx.send(f"{ctx.author.mention} Your timer has finished!")
-
-# Modify your on_ready event to set the saved activity
-@bot.event
-async def on_ready():
-    print(f'Bot is ready as {bot.user}')
-    
-    # Load activity and status from config
-    config = load_config()
-    activity_config = config.get("bot_activity", {})
-    status_config = config.get("bot_status", "online")
     
-    # Set activity if configured
-    if activity_config:
-        activity_types = {
-            "playing": ActivityType.playing,
-            "watching": ActivityType.watching,
-            "listening": ActivityType.listening,
-            "streaming": ActivityType.streaming,
-            "competing": ActivityType.competing
-        }
-        
-        activity_type = activity_config.get("type", "playing")
-        activity_text = activity_config.get("text", "")
-        
-        activity = Activity(
-            type=activity_types.get(activity_type, ActivityType.playing),
-            name=activity_text
-        )
-        
-        # Set status
-        status_options = {
-            "online": Status.online,
-            "idle": Status.idle,
-            "dnd": Status.dnd,
-            "invisible": Status.invisible
-        }
-        
-        await bot.change_presence(
-            status=status_options.get(status_config, Status.online),
-            activity=activity
-        )
-
-        # Add these imports at the top of your file
-
+    # Post a placeholder, then let the scheduler own the message
+    message = await ctx.send(embed=discord.Embed(title="⏱️ Timer Started", color=discord.Color.blue()))
+    timer_data = timer_scheduler.add(ctx.channel.id, message.id, ctx.author.id, str(ctx.author), total_seconds)
+    await message.edit(embed=timer_embed(timer_data, PHASE_RUNNING))
 
 # Form registration system
 class TeamRegistrationForm(Modal):
@@ -669,13 +710,9 @@ class TeamRegistrationForm(Modal):
         user_name = self.name_input.value.strip()
         team_name = self.team_input.value.strip()
         
-        # Get config and initialize registrations if not exists
-        config = load_config()
-        if "registrations" not in config:
-            config["registrations"] = []
-        
         # Store registration data
         registration_data = {
+            "guild_id": interaction.guild.id,
             "user_id": interaction.user.id,
             "user_discord_name": interaction.user.name,
             "provided_name": user_name,
@@ -683,42 +720,49 @@ class TeamRegistrationForm(Modal):
             "timestamp": datetime.datetime.now().isoformat()
         }
         
-        config["registrations"].append(registration_data)
-        save_config(config)
-        
-        # Check if team role exists
+        # Queued for the next group commit; returns the team they were in before
+        previous_team = storage.submit_registration(registration_data)
+
+        # Acknowledge now so role creation can't make the modal time out
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        # Find the team role, or create it (once, even if teammates submit together)
         guild = interaction.guild
-        team_role = discord.utils.get(guild.roles, name=team_name)
-        role_created = False
-        
-        if not team_role:
-            # Create the team role
-            try:
-                team_role = await guild.create_role(
-                    name=team_name,
-                    color=discord.Color.random(),
-                    reason=f"Team created for {user_name}"
-                )
-                role_created = True
-            except discord.Forbidden:
-                await interaction.response.send_message("I don't have permission to create roles.", ephemeral=True)
-                return
+        try:
+            team_role, role_created = await role_index.get_or_create(
+                guild,
+                team_name,
+                color=discord.Color.random(),
+                reason=f"Team created for {user_name}"
+            )
+        except discord.Forbidden:
+            await interaction.followup.send("I don't have permission to create roles.", ephemeral=True)
+            return
             
         # Assign the role silently
         try:
             await interaction.user.add_roles(team_role, reason=f"Registered for team {team_name}")
         except discord.Forbidden:
-            await interaction.response.send_message("I don't have permission to assign roles.", ephemeral=True)
+            await interaction.followup.send("I don't have permission to assign roles.", ephemeral=True)
             return
+
+        # Switching teams: take the old team's role away
+        if previous_team and previous_team != team_name:
+            old_role = role_index.get(guild, previous_team)
+            if old_role and old_role in interaction.user.roles:
+                try:
+                    await interaction.user.remove_roles(old_role, reason=f"Moved to team {team_name}")
+                except discord.Forbidden:
+                    pass
             
         # Send confirmation message
         if role_created:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 f"Thank you for registering, **{user_name}**! 🤗 ", 
                 ephemeral=True
             )
         else:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 f"Thank you for registering, {user_name}! You've been assigned to team **{team_name}**.", 
                 ephemeral=True
             )
@@ -759,74 +803,144 @@ async def setup_registration(ctx, channel: discord.TextChannel = None):
     message = await channel.send(embed=embed, view=view)
     
     # Store message info in config
-    config = load_config()
-    config["registration_form"] = {
+    guild_config(ctx.guild.id)["registration_form"] = {
         "message_id": message.id,
         "channel_id": channel.id
     }
-    save_config(config)
+    save_config()
     
     await ctx.send(f"Registration form has been set up in {channel.mention}.")
 
 
-# Command to export registrations as CSV
+# Command to export registrations
 @bot.command()
 @commands.has_permissions(administrator=True)
-async def export_registrations(ctx, channel: discord.TextChannel = None):
-    """Exports all team registrations as a CSV file"""
+async def export_registrations(ctx, channel: typing.Optional[discord.TextChannel] = None, *options: str):
+    """Exports team registrations. Options (all optional):
+    format=csv|jsonl|teams  team=<name>  since=YYYY-MM-DD  until=YYYY-MM-DD  gzip=yes|no
+    A value runs until the next option, so `team=Data Wizards` works without quotes.
+    Large exports are split into several files that each fit the upload limit."""
     if not channel:
         channel = ctx.channel
     
-    # Load registrations data
-    config = load_config()
-    registrations = config.get("registrations", [])
+    settings = {"format": "csv", "team": None, "since": None, "until": None, "gzip": "no"}
+    key = None
+    for option in options:
+        name, sep, value = option.partition("=")
+        if sep and name.lower() in settings:
+            key = name.lower()
+            settings[key] = value
+        elif key is not None and not sep:
+            # Words after an option belong to its value (team names have spaces)
+            settings[key] += " " + option
+        else:
+            await ctx.send(f"Unknown option `{option}`. Use format=, team=, since=, until= or gzip=.")
+            return
     
-    if not registrations:
-        await ctx.send("No registrations found!")
+    fmt = settings["format"].lower()
+    if fmt not in EXPORT_FORMATS:
+        await ctx.send(f"Unknown format `{fmt}`. Choose one of: {', '.join(EXPORT_FORMATS)}.")
         return
+    try:
+        since = parse_date(settings["since"])
+        until = parse_date(settings["until"], end=True)
+    except ValueError as e:
+        await ctx.send(str(e))
+        return
+    compress = settings["gzip"].lower() in ("yes", "true", "1", "on")
     
-    # Create CSV in memory
-    output = StringIO()
-    csv_writer = csv.writer(output)
-    
-    # Write headers
-    csv_writer.writerow([
-        "Discord User ID", 
-        "Discord Username", 
-        "Provided Name", 
-        "Team Name", 
-        "Registration Date"
-    ])
-    
-    # Write data rows
-    for reg in registrations:
-        csv_writer.writerow([
-            reg.get("user_id", ""),
-            reg.get("user_discord_name", ""),
-            reg.get("provided_name", ""),
-            reg.get("team_name", ""),
-            reg.get("timestamp", "")
-        ])
-    
-    # Reset the position to the beginning of the buffer
-    output.seek(0)
-    
-    # Create a file to send
-    file = discord.File(
-        fp=StringIO(output.getvalue()),
-        filename=f"team_registrations_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    )
+    if storage.count_registrations(ctx.guild.id) == 0:
+        await ctx.send("No registrations found!")
+        return
     
-    # Send the file
-    await channel.send("Here are the team registrations:", file=file)
+    total = storage.count_registrations(ctx.guild.id) if fmt != "teams" and not (settings["team"] or since or until) else None
+    status_message = await ctx.send("Exporting registrations...")
+    basename = f"team_registrations_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if fmt == "teams":
+        basename = f"team_summary_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    
+    loop = asyncio.get_running_loop()
+    reader = storage.open_reader()
+    with tempfile.TemporaryDirectory(prefix="export_") as directory:
+        # Rows are streamed from the database to disk in a worker thread
+        async with ProgressReporter(status_message, "Exporting registrations", total=total) as progress:
+            try:
+                paths, rows = await asyncio.to_thread(
+                    write_export,
+                    reader,
+                    ctx.guild.id,
+                    directory,
+                    basename,
+                    fmt,
+                    channel.guild.filesize_limit,
+                    compress=compress,
+                    team=settings["team"],
+                    since=since,
+                    until=until,
+                    on_progress=lambda done: loop.call_soon_threadsafe(progress.update, done)
+                )
+            finally:
+                reader.close()
+            progress.update(done=rows)
+        
+        if rows == 0:
+            await ctx.send("No registrations match those filters.")
+            return
+        
+        # Upload one part at a time so only one file is open at once
+        for number, path in enumerate(paths, start=1):
+            label = "Here are the team registrations" if fmt != "teams" else "Here is the team summary"
+            if len(paths) > 1:
+                label += f" (part {number}/{len(paths)})"
+            await channel.send(f"{label}:", file=discord.File(path, filename=os.path.basename(path)))
 
-@bot.event
-async def on_ready():
-    print(f'Bot is ready as {bot.user}')
-    
-    config = load_config()
-    if "registration_form" in config:
-        bot.add_view(RegistrationButton())
+# Live numbers for organisers, read from aggregates kept up to date by storage
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def stats(ctx, hours: int = 12):
+    """Shows teams, team sizes, registrations per hour and ticket statistics"""
+    hours = max(1, min(hours, 24))
+    team_counts = storage.team_counts(ctx.guild.id)
+    embed = discord.Embed(title="📊 Event Statistics", color=discord.Color.blue())
+    
+    # Teams
+    sizes = sorted(team_counts.values())
+    if sizes:
+        largest = sorted(team_counts.items(), key=lambda item: (-item[1], item[0]))[:5]
+        embed.add_field(
+            name="Teams",
+            value=(
+                f"**{len(team_counts)}** teams, **{storage.count_registrations(ctx.guild.id)}** members\n"
+                f"Size: min {sizes[0]} / median {sizes[len(sizes) // 2]} / max {sizes[-1]}\n"
+                + "\n".join(f"{name}: {count}" for name, count in largest)
+            )[:1024],
+            inline=False
+        )
+    else:
+        embed.add_field(name="Teams", value="No registrations yet", inline=False)
+    
+    # Registrations per hour
+    hourly = storage.registrations_per_hour(ctx.guild.id, hours)
+    if hourly:
+        peak = max(count for _, count in hourly)
+        lines = [
+            f"`{hour[5:10]} {hour[11:13]}h` {'█' * max(1, round(count / peak * 10))} {count}"
+            for hour, count in hourly
+        ]
+        embed.add_field(name=f"New registrations (last {len(hourly)} active hours)", value="\n".join(lines)[:1024], inline=False)
+    
+    # Tickets
+    histogram = storage.close_latency_histogram(ctx.guild.id)
+    closed = sum(histogram.values())
+    ticket_lines = [f"Open: **{storage.count_open_tickets(ctx.guild.id)}**", f"Closed: **{closed}**"]
+    median = histogram_quantile(histogram, 0.5)
+    if median is not None:
+        ticket_lines.append(f"Median time to close: **{format_duration(median)}**")
+        ticket_lines.append(f"90th percentile: {format_duration(histogram_quantile(histogram, 0.9))}")
+        ticket_lines.extend(f"{label}: {count}" for label, count in latency_bands(histogram) if count)
+    embed.add_field(name="Tickets", value="\n".join(ticket_lines), inline=False)
+    
+    await ctx.send(embed=embed)
 
 # Add these imports at the top of your file if needed
 from discord.ui import Button, View, Modal, TextInput
@@ -839,21 +953,16 @@ class TicketButton(View):
     
     @discord.ui.button(label="Create Support Ticket", style=discord.ButtonStyle.green, emoji="🎫", custom_id="create_ticket_button")
     async def create_ticket(self, interaction: discord.Interaction, button):
-        # Check if user already has a ticket open
-        config = load_config()
-        tickets = config.get("tickets", {})
-        
-        # Check for existing ticket by this user
-        user_id = str(interaction.user.id)
-        for ticket_id, ticket_data in tickets.items():
-            if ticket_data.get("creator_id") == user_id and not ticket_data.get("closed", False):
-                existing_channel = interaction.guild.get_channel(int(ticket_data.get("channel_id")))
-                if existing_channel:
-                    await interaction.response.send_message(
-                        f"You already have an open ticket: {existing_channel.mention}",
-                        ephemeral=True
-                    )
-                    return
+        # Check for an existing open ticket by this user
+        ticket_data = storage.get_open_ticket(interaction.guild.id, interaction.user.id)
+        if ticket_data:
+            existing_channel = interaction.guild.get_channel(ticket_data["channel_id"])
+            if existing_channel:
+                await interaction.response.send_message(
+                    f"You already have an open ticket: {existing_channel.mention}",
+                    ephemeral=True
+                )
+                return
         
         # Open a ticket form
         ticket_modal = TicketCreationModal()
@@ -880,19 +989,33 @@ class TicketCreationModal(Modal):
         self.add_item(self.description)
     
     async def on_submit(self, interaction: discord.Interaction):
-        # Load configuration
-        config = load_config()
-        if "tickets" not in config:
-            config["tickets"] = {}
+        # The user may have submitted twice before the first ticket was created
+        ticket_data = storage.get_open_ticket(interaction.guild.id, interaction.user.id)
+        if ticket_data and interaction.guild.get_channel(ticket_data["channel_id"]):
+            await interaction.response.send_message(
+                f"You already have an open ticket: <#{ticket_data['channel_id']}>",
+                ephemeral=True
+            )
+            return
+        # A ticket is only stored once its channel exists, so reserve the
+        # user's slot before the first await
+        opening_key = (interaction.guild.id, interaction.user.id)
+        if opening_key in tickets_opening:
+            await interaction.response.send_message(
+                "Your ticket is already being created.",
+                ephemeral=True
+            )
+            return
+        tickets_opening.add(opening_key)
         
-        # Get the support role
-        support_role_id = config.get("support_role_id")
+        # Get this guild's support role
+        support_role_id = config_store.guild_get(interaction.guild.id, "support_role_id")
         support_role = None
         if support_role_id:
             support_role = interaction.guild.get_role(int(support_role_id))
         
         # Create ticket channel name
-        ticket_id = len(config["tickets"]) + 1
+        ticket_id = storage.allocate_ticket_id()
         channel_name = f"ticket-{ticket_id:04d}-{interaction.user.name}"
         
         # Set permissions for the channel
@@ -906,23 +1029,35 @@ class TicketCreationModal(Modal):
         if support_role:
             overwrites[support_role] = discord.PermissionOverwrite(read_messages=True)
         
+        topic = f"Support ticket for {interaction.user.name} | Subject: {self.subject.value}"
         try:
-            # Create the ticket channel
-            ticket_channel = await interaction.guild.create_text_channel(
-                name=channel_name,
-                overwrites=overwrites,
-                topic=f"Support ticket for {interaction.user.name} | Subject: {self.subject.value}"
-            )
+            # Turn a pre-created channel into the ticket with one edit if the
+            # pool has one, otherwise create the channel now
+            ticket_channel = ticket_pool.claim(interaction.guild)
+            if ticket_channel:
+                try:
+                    await ticket_channel.edit(name=channel_name, topic=topic, overwrites=overwrites)
+                except discord.HTTPException:
+                    # The channel is still a hidden spare, so it goes back in the pool
+                    ticket_pool.release(ticket_channel)
+                    raise
+            else:
+                ticket_channel = await interaction.guild.create_text_channel(
+                    name=channel_name,
+                    overwrites=overwrites,
+                    topic=topic
+                )
+            ticket_pool.refill(interaction.guild)
             
             # Store ticket info
-            config["tickets"][str(ticket_id)] = {
-                "creator_id": str(interaction.user.id),
-                "channel_id": str(ticket_channel.id),
-                "subject": self.subject.value,
-                "opened_at": datetime.datetime.now().isoformat(),
-                "closed": False
-            }
-            save_config(config)
+            storage.add_ticket(
+                ticket_id,
+                guild_id=interaction.guild.id,
+                creator_id=interaction.user.id,
+                channel_id=ticket_channel.id,
+                subject=self.subject.value,
+                opened_at=datetime.datetime.now().isoformat()
+            )
             
             # Create ticket embed
             ticket_embed = discord.Embed(
@@ -935,7 +1070,7 @@ class TicketCreationModal(Modal):
             ticket_embed.set_footer(text="Use the buttons below to manage this ticket")
             
             # Create ticket management view
-            ticket_controls = TicketControlsView(ticket_id)
+            ticket_controls = TicketControlsView()
             
             # Send the initial message in the ticket channel
             await ticket_channel.send(
@@ -960,18 +1095,32 @@ class TicketCreationModal(Modal):
                 f"An error occurred while creating your ticket: {str(e)}",
                 ephemeral=True
             )
+        finally:
+            tickets_opening.discard(opening_key)
 
 class TicketControlsView(View):
-    def __init__(self, ticket_id):
+    """Controls posted in every ticket channel.
+
+    A single instance is registered for all tickets: the ticket is looked
+    up from the channel the button was clicked in.
+    """
+    def __init__(self):
         super().__init__(timeout=None)
-        self.ticket_id = ticket_id
     
-    @discord.ui.button(label="Close Ticket", style=discord.ButtonStyle.red, emoji="🔒", custom_id=f"close_ticket_button")
+    @discord.ui.button(label="Close Ticket", style=discord.ButtonStyle.red, emoji="🔒", custom_id="close_ticket_button")
     async def close_ticket(self, interaction: discord.Interaction, button):
+        ticket_data = storage.get_ticket_by_channel(interaction.channel_id)
+        if not ticket_data:
+            await interaction.response.send_message("This channel is not a ticket.", ephemeral=True)
+            return
+        if ticket_data["closed"]:
+            await interaction.response.send_message("This ticket is already closed.", ephemeral=True)
+            return
+        
         # Confirm closure
-        confirm_view = ConfirmCloseView(self.ticket_id)
+        confirm_view = ConfirmCloseView(ticket_data["ticket_id"])
         await interaction.response.send_message(
-            "Are you sure you want to close this ticket? This will delete the channel in 10 seconds after closing.",
+            f"Are you sure you want to close this ticket? This will delete the channel {ticket_delete_after():g} seconds after closing.",
             view=confirm_view,
             ephemeral=True
         )
@@ -984,26 +1133,35 @@ class ConfirmCloseView(View):
     @discord.ui.button(label="Yes, Close Ticket", style=discord.ButtonStyle.red, emoji="✅")
     async def confirm_close(self, interaction: discord.Interaction, button):
         # Close the ticket
-        config = load_config()
-        if "tickets" not in config or str(self.ticket_id) not in config["tickets"]:
+        ticket_data = storage.get_ticket(self.ticket_id)
+        if not ticket_data:
             await interaction.response.send_message("This ticket no longer exists.", ephemeral=True)
             return
         
-        # Mark ticket as closed
-        ticket_data = config["tickets"][str(self.ticket_id)]
-        ticket_data["closed"] = True
-        ticket_data["closed_by"] = str(interaction.user.id)
-        ticket_data["closed_at"] = datetime.datetime.now().isoformat()
-        save_config(config)
-        
         # Get the channel
         channel = interaction.channel
         
-        # Create transcript (optional - you can expand this)
-        # For a simple implementation, let's just archive by changing permissions
+        # Mark ticket as closed
+        storage.close_ticket(
+            self.ticket_id,
+            closed_by=interaction.user.id,
+            closed_at=datetime.datetime.now().isoformat()
+        )
+        
+        # Queue the channel before any Discord call that could fail: a closed
+        # ticket can't be closed again, so the reaper is the only way it goes.
+        # The reaper deletes it even if the bot restarts in between, and saves
+        # the transcript just before.
+        delete_after = ticket_delete_after()
+        ticket_reaper.schedule(
+            channel.id,
+            self.ticket_id,
+            reason=f"Ticket #{self.ticket_id:04d} closed by {interaction.user}",
+            delay=delete_after
+        )
         try:
             # Remove user access but keep log viewable by staff
-            ticket_creator_id = int(ticket_data.get("creator_id"))
+            ticket_creator_id = ticket_data["creator_id"]
             creator = interaction.guild.get_member(ticket_creator_id)
             
             if creator:
@@ -1012,7 +1170,7 @@ class ConfirmCloseView(View):
             # Send closure notice
             close_embed = discord.Embed(
                 title=f"Ticket #{self.ticket_id:04d} Closed",
-                description=f"This ticket has been closed by {interaction.user.mention}.\nThis channel will be deleted in 10 seconds.",
+                description=f"This ticket has been closed by {interaction.user.mention}.\nThis channel will be deleted in {delete_after:g} seconds.",
                 color=discord.Color.red(),
                 timestamp=datetime.datetime.now()
             )
@@ -1024,10 +1182,6 @@ class ConfirmCloseView(View):
             
             await interaction.response.edit_message(content="Ticket closing...", view=self)
             
-            # Schedule channel deletion
-            await asyncio.sleep(10)
-            await channel.delete(reason=f"Ticket #{self.ticket_id:04d} closed by {interaction.user}")
-            
         except discord.Forbidden:
             await interaction.response.send_message(
                 "I don't have permission to manage this ticket channel.",
@@ -1066,39 +1220,157 @@ async def setup_tickets(ctx, channel: discord.TextChannel = None, support_role:
     message = await channel.send(embed=embed, view=view)
     
     # Store configuration
-    config = load_config()
-    config["ticket_system"] = {
+    settings = guild_config(ctx.guild.id)
+    settings["ticket_system"] = {
         "channel_id": channel.id,
         "message_id": message.id
     }
     
     if support_role:
-        config["support_role_id"] = support_role.id
+        settings["support_role_id"] = support_role.id
     
-    save_config(config)
+    save_config()
+    ticket_pool.refill(ctx.guild)
     
     await ctx.send(f"Ticket system has been set up in {channel.mention}!")
 
-# Add this to your on_ready event
+def _config_ids(value):
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _config_ids(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _config_ids(item)
+    elif isinstance(value, int) and not isinstance(value, bool):
+        yield value
+
+def find_config_guild(value):
+    """The guild a config setting belongs to, from the channel or role IDs in it"""
+    ids = list(_config_ids(value))
+    for object_id in ids:
+        channel = bot.get_channel(object_id)
+        if channel is not None and getattr(channel, "guild", None):
+            return channel.guild.id
+    for object_id in ids:
+        for guild in bot.guilds:
+            if guild.get_role(object_id):
+                return guild.id
+    return None
+
+# Per-shard connection health
+shard_health = ShardHealth()
+
+if isinstance(bot, commands.AutoShardedBot):
+    @bot.listen('on_shard_connect')
+    async def track_shard_connect(shard_id):
+        shard_health.connected(shard_id)
+
+    @bot.listen('on_shard_ready')
+    async def track_shard_ready(shard_id):
+        shard_health.ready(shard_id)
+
+    @bot.listen('on_shard_resumed')
+    async def track_shard_resumed(shard_id):
+        shard_health.resumed(shard_id)
+
+    @bot.listen('on_shard_disconnect')
+    async def track_shard_disconnect(shard_id):
+        shard_health.disconnected(shard_id)
+else:
+    @bot.listen('on_connect')
+    async def track_connect():
+        shard_health.connected(0)
+
+    @bot.listen('on_ready')
+    async def track_ready():
+        shard_health.ready(0)
+
+    @bot.listen('on_resumed')
+    async def track_resumed():
+        shard_health.resumed(0)
+
+    @bot.listen('on_disconnect')
+    async def track_disconnect():
+        shard_health.disconnected(0)
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def shards(ctx):
+    """Show the state, latency and guild count of each shard"""
+    icons = {"ready": "🟢", "connected": "🟡", "starting": "🟡", "disconnected": "🔴"}
+    lines = []
+    for shard in shard_health.report(bot):
+        latency = f"{shard['latency_ms']} ms" if shard["latency_ms"] is not None else "n/a"
+        lines.append(
+            f"{icons.get(shard['state'], '⚪')} **Shard {shard['shard_id']}**: {shard['state']} "
+            f"for {format_duration(shard['for_seconds'])}, {latency}, {shard['guilds']} guilds, "
+            f"{shard['disconnects']} disconnects, {shard['resumes']} resumes"
+        )
+    this_shard = ctx.guild.shard_id if ctx.guild else None
+    header = f"Serving {len(bot.guilds)} guilds" + (f" (this one is on shard {this_shard})" if this_shard is not None else "")
+    await ctx.send(header + "\n" + "\n".join(lines)[:1900])
+
+# Startup: everything runs once, with the time each phase takes logged
+startup_timings = []
+startup_complete = False
+
+@contextlib.contextmanager
+def startup_phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings.append((name, time.perf_counter() - started))
+
+def register_persistent_views():
+    # One view per component type; each resolves its ticket/form when clicked,
+    # so this costs the same however many tickets are open
+    bot.add_view(RegistrationButton())
+    bot.add_view(TicketButton())
+    bot.add_view(TicketControlsView())
+
+@bot.event
+async def setup_hook():
+    with startup_phase("persistent views"):
+        register_persistent_views()
+    with startup_phase("config watcher"):
+        # Pick up manual edits to bot_config.json without a restart
+        config_store.start_watching()
+    with startup_phase("timers and conversations"):
+        # Resume timers and DM conversations saved before the last restart
+        timer_scheduler.start()
+        conversations.start_expiry()
+    with startup_phase("ticket reaper"):
+        # Delete channels of tickets closed before the restart, archive old tickets
+        ticket_reaper.start()
+
 @bot.event
 async def on_ready():
+    global startup_complete
     print(f'Bot is ready as {bot.user}')
-    
-    # Existing code...
-    config = load_config()
-    if "registration_form" in config:
-        bot.add_view(RegistrationButton())
-    
-    # Add ticket button view
-    if "ticket_system" in config:
-        bot.add_view(TicketButton())
-        
-    # Add ticket control views for any open tickets
-    if "tickets" in config:
-        for ticket_id, ticket_data in config["tickets"].items():
-            if not ticket_data.get("closed", False):
-                bot.add_view(TicketControlsView(int(ticket_id)))
+    if startup_complete:
+        return  # Reconnected; discord.py re-sends the presence itself
+    startup_complete = True
+    
+    with startup_phase("presence"):
+        status, activity = saved_presence(load_config())
+        await bot.change_presence(status=status, activity=activity)
+    
+    with startup_phase("guild settings"):
+        # Settings and data from before per-guild namespaces go to their guild
+        if config_store.migrate_to_guilds(find_config_guild):
+            save_config()
+        if len(bot.guilds) == 1 and storage.adopt_unscoped(bot.guilds[0].id):
+            print(f"Assigned existing registrations and tickets to {bot.guilds[0].name}")
+    
+    with startup_phase("ticket pool"):
+        ticket_pool.load(bot)
+        for guild in bot.guilds:
+            if config_store.guild_get(guild.id, "ticket_system"):
+                ticket_pool.refill(guild)
+    
+    phases = ", ".join(f"{name} {elapsed * 1000:.1f}ms" for name, elapsed in startup_timings)
+    print(f"Startup took {time.perf_counter() - STARTED_AT:.2f}s ({phases})")
 
-
-        
-bot.run(TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    bot.run(TOKEN)
\ No newline at end of file
@@ -0,0 +1,469 @@
+import asyncio
+import datetime
+import gzip
+import json
+import zlib
+
+import discord
+
+
+# Rough request rates (per second) used to estimate how long a clone takes.
+# discord.py does the real pacing from the rate-limit headers of each route.
+ROUTE_RATES = {
+    "roles": 1.0,
+    "channels": 1.0,
+}
+
+
+def _overwrites_to_list(overwrites):
+    result = []
+    for target, overwrite in overwrites.items():
+        allow, deny = overwrite.pair()
+        result.append({
+            "id": target.id,
+            "type": "role" if isinstance(target, discord.Role) else "member",
+            "allow": allow.value,
+            "deny": deny.value,
+        })
+    return result
+
+
+def iter_guild_objects(guild):
+    """Yield (kind, data) for every role, category and channel of a guild.
+
+    Only ids, names and settings are kept, so the data can be planned
+    against any target guild or streamed to a snapshot file. Roles come
+    first, then categories, then channels.
+    """
+    for role in guild.roles:
+        # @everyone always exists; bot and integration roles can't be created by hand
+        if role.is_default() or role.managed:
+            continue
+        yield "role", {
+            "id": role.id,
+            "name": role.name,
+            "permissions": role.permissions.value,
+            "color": role.color.value,
+            "hoist": role.hoist,
+            "mentionable": role.mentionable,
+            "position": role.position,
+        }
+
+    for category in guild.categories:
+        yield "category", {
+            "id": category.id,
+            "name": category.name,
+            "position": category.position,
+            "overwrites": _overwrites_to_list(category.overwrites),
+        }
+
+    for channel in guild.channels:
+        if isinstance(channel, discord.TextChannel):
+            yield "channel", {
+                "id": channel.id,
+                "type": "text",
+                "name": channel.name,
+                "category_id": channel.category_id,
+                "position": channel.position,
+                "topic": channel.topic,
+                "slowmode_delay": channel.slowmode_delay,
+                "nsfw": channel.nsfw,
+                "overwrites": _overwrites_to_list(channel.overwrites),
+            }
+        elif isinstance(channel, discord.VoiceChannel):
+            yield "channel", {
+                "id": channel.id,
+                "type": "voice",
+                "name": channel.name,
+                "category_id": channel.category_id,
+                "position": channel.position,
+                "bitrate": channel.bitrate,
+                "user_limit": channel.user_limit,
+                "overwrites": _overwrites_to_list(channel.overwrites),
+            }
+
+
+def _guild_header(guild):
+    return {"id": guild.id, "name": guild.name, "default_role_id": guild.default_role.id}
+
+
+def _empty_snapshot(guild_header):
+    return {"guild": guild_header, "roles": [], "categories": [], "channels": []}
+
+
+SNAPSHOT_KINDS = {"role": "roles", "category": "categories", "channel": "channels"}
+
+
+def capture_guild(guild):
+    """Capture a guild's roles, categories and channels as plain data"""
+    snapshot = _empty_snapshot(_guild_header(guild))
+    for kind, data in iter_guild_objects(guild):
+        snapshot[SNAPSHOT_KINDS[kind]].append(data)
+    return snapshot
+
+
+# Snapshot files are gzip-compressed JSON Lines: a header line, then one
+# line per object, so they can be written and read one object at a time.
+SNAPSHOT_FORMAT = "databounty-guild-snapshot"
+SNAPSHOT_VERSION = 1
+
+# Keys restore relies on and their types, checked when a snapshot is read back
+_ID = (int,)
+_TEXT = (str,)
+_FLAG = (bool,)
+_OPTIONAL_ID = (int, type(None))
+SNAPSHOT_FIELDS = {
+    "guild": {"id": _ID, "name": _TEXT, "default_role_id": _ID},
+    "role": {"id": _ID, "name": _TEXT, "permissions": _ID, "color": _ID, "hoist": _FLAG,
+             "mentionable": _FLAG, "position": _ID},
+    "category": {"id": _ID, "name": _TEXT, "position": _ID, "overwrites": (list,)},
+    "channel": {"id": _ID, "type": _TEXT, "name": _TEXT, "category_id": _OPTIONAL_ID, "position": _ID,
+                "overwrites": (list,)},
+    "text": {"topic": (str, type(None)), "slowmode_delay": _ID, "nsfw": _FLAG},
+    "voice": {"bitrate": _ID, "user_limit": _ID},
+    "overwrite": {"id": _ID, "type": _TEXT, "allow": _ID, "deny": _ID},
+}
+
+
+def write_snapshot(guild, path):
+    """Stream a guild snapshot to ``path``. Returns the number of objects written."""
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        header = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "guild": _guild_header(guild),
+        }
+        f.write(json.dumps(header) + "\n")
+        for kind, data in iter_guild_objects(guild):
+            f.write(json.dumps({"kind": kind, **data}) + "\n")
+            count += 1
+    return count
+
+
+def _valid(data, kind):
+    return isinstance(data, dict) and all(
+        isinstance(data.get(key), types) for key, types in SNAPSHOT_FIELDS[kind].items()
+    )
+
+
+def _valid_object(data, kind):
+    if not _valid(data, kind):
+        return False
+    if kind == "channel" and (data["type"] not in ("text", "voice") or not _valid(data, data["type"])):
+        return False
+    return all(_valid(overwrite, "overwrite") for overwrite in data.get("overwrites", []))
+
+
+def read_snapshot(path):
+    """Read a snapshot file line by line into the same structure capture_guild returns.
+
+    Raises ValueError if the file isn't a snapshot or is malformed.
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return _read_snapshot_lines(f)
+    except (EOFError, zlib.error, gzip.BadGzipFile):
+        raise ValueError("Snapshot file is truncated or not gzip-compressed")
+
+
+def _read_snapshot_lines(f):
+    try:
+        header = json.loads(f.readline())
+    except json.JSONDecodeError:
+        raise ValueError("Not a guild snapshot file")
+    if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("Not a guild snapshot file")
+    version = header.get("version", 0)
+    if not isinstance(version, int):
+        raise ValueError("Malformed snapshot header")
+    if version > SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {version} is newer than this bot supports")
+    if not _valid(header.get("guild"), "guild"):
+        raise ValueError("Malformed snapshot header")
+
+    snapshot = _empty_snapshot(header["guild"])
+    for line_number, line in enumerate(f, start=2):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f"Malformed snapshot line {line_number}")
+        if not isinstance(data, dict) or "kind" not in data:
+            raise ValueError(f"Malformed snapshot line {line_number}")
+        kind = data.pop("kind")
+        if kind not in SNAPSHOT_KINDS:
+            continue
+        if not _valid_object(data, kind):
+            raise ValueError(f"Malformed snapshot {kind} on line {line_number}")
+        snapshot[SNAPSHOT_KINDS[kind]].append(data)
+    return snapshot
+
+
+class ClonePlan:
+    """Dependency-ordered list of what to create: roles, then categories, then channels.
+
+    Channels are grouped under their category so each group can start as
+    soon as its category exists.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.source_name = snapshot["guild"]["name"]
+        self.default_role_id = snapshot["guild"]["default_role_id"]
+
+        # Highest role first, like the Discord role list
+        self.roles = sorted(snapshot["roles"], key=lambda role: role["position"], reverse=True)
+        self.categories = sorted(snapshot["categories"], key=lambda category: category["position"])
+
+        category_ids = {category["id"] for category in self.categories}
+        self.channels_by_category = {category["id"]: [] for category in self.categories}
+        self.uncategorized = []
+        for channel in sorted(snapshot["channels"], key=lambda channel: channel["position"]):
+            if channel["category_id"] in category_ids:
+                self.channels_by_category[channel["category_id"]].append(channel)
+            else:
+                self.uncategorized.append(channel)
+
+    @property
+    def channel_count(self):
+        return len(self.uncategorized) + sum(len(channels) for channels in self.channels_by_category.values())
+
+    @property
+    def total(self):
+        return len(self.roles) + len(self.categories) + self.channel_count
+
+    def estimated_seconds(self):
+        """Estimate of the clone duration from the per-route request rates"""
+        role_time = len(self.roles) / ROUTE_RATES["roles"]
+        channel_time = (len(self.categories) + self.channel_count) / ROUTE_RATES["channels"]
+        # Roles must finish before any channel can be created
+        return role_time + channel_time
+
+    def describe(self):
+        """Human readable summary of the plan"""
+        lines = [f"Clone plan for {self.source_name}:"]
+        lines.append(f"1. Create {len(self.roles)} roles, then reorder them in one request")
+        lines.append(f"2. Create {len(self.categories)} categories with remapped permission overwrites")
+        lines.append(f"3. Create {self.channel_count} channels ({len(self.uncategorized)} without a category)")
+        for category in self.categories:
+            lines.append(f"   • {category['name']}: {len(self.channels_by_category[category['id']])} channels")
+        minutes, seconds = divmod(int(self.estimated_seconds()), 60)
+        lines.append(f"Estimated duration: ~{minutes}m {seconds:02d}s for {self.total} objects")
+        return "\n".join(lines)
+
+
+class CloneExecutor:
+    """Creates the objects of a ClonePlan in a target guild.
+
+    Requests to the same route (roles, channels) share a concurrency limit;
+    discord.py paces each route by its rate-limit headers, so several
+    requests can be in flight without fixed sleeps in between.
+
+    With ``incremental=True`` (used for restores) objects that already
+    exist in the target are matched by id or name and only edited when
+    their settings differ; only missing objects are created.
+    """
+
+    def __init__(self, plan, target_guild, concurrency=5, progress=None, incremental=False):
+        self.plan = plan
+        self.guild = target_guild
+        self.progress = progress
+        self.incremental = incremental
+        self.routes = {route: asyncio.Semaphore(concurrency) for route in ROUTE_RATES}
+        self.role_mapping = {plan.default_role_id: target_guild.default_role}
+        self.category_mapping = {}
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        self._new_roles = set()
+
+        if incremental:
+            self._roles_by_name = {
+                role.name: role for role in target_guild.roles
+                if not role.is_default() and not role.managed
+            }
+            self._categories_by_name = {category.name: category for category in target_guild.categories}
+            self._channels_by_key = {
+                (channel.category_id, type(channel), channel.name): channel
+                for channel in target_guild.channels
+                if isinstance(channel, (discord.TextChannel, discord.VoiceChannel))
+            }
+
+    def _done(self, outcome="created"):
+        if outcome == "created":
+            self.created += 1
+        elif outcome == "updated":
+            self.updated += 1
+        elif outcome == "unchanged":
+            self.unchanged += 1
+        if self.progress:
+            self.progress.update(advance=1, failed=1 if outcome == "failed" else 0)
+
+    def _fail(self, kind, name, error):
+        self.errors.append(f"Could not create {kind} {name}: {error}")
+        self._done("failed")
+
+    def remap_overwrites(self, overwrites):
+        """Translate source overwrites into ones that point at target roles and members"""
+        result = {}
+        for overwrite in overwrites:
+            if overwrite["type"] == "role":
+                target = self.role_mapping.get(overwrite["id"])
+            else:
+                target = self.guild.get_member(overwrite["id"])
+            if target is None:
+                continue
+            result[target] = discord.PermissionOverwrite.from_pair(
+                discord.Permissions(overwrite["allow"]), discord.Permissions(overwrite["deny"])
+            )
+        return result
+
+    # Matching existing objects (incremental mode)
+
+    def _existing_role(self, role):
+        existing = self.guild.get_role(role["id"])
+        if existing is not None and not existing.managed:
+            return existing
+        return self._roles_by_name.get(role["name"])
+
+    def _existing_category(self, category):
+        existing = self.guild.get_channel(category["id"])
+        if isinstance(existing, discord.CategoryChannel):
+            return existing
+        return self._categories_by_name.get(category["name"])
+
+    def _existing_channel(self, channel, category):
+        channel_type = discord.TextChannel if channel["type"] == "text" else discord.VoiceChannel
+        existing = self.guild.get_channel(channel["id"])
+        if isinstance(existing, channel_type):
+            return existing
+        return self._channels_by_key.get((category.id if category else None, channel_type, channel["name"]))
+
+    async def _sync(self, kind, name, route, obj, changes):
+        """Edit ``obj`` if any of ``changes`` differ from its current settings"""
+        changes = {key: value for key, value in changes.items() if getattr(obj, key) != value}
+        if not changes:
+            self._done("unchanged")
+            return
+        async with self.routes[route]:
+            try:
+                await obj.edit(**changes)
+            except discord.HTTPException as e:
+                self.errors.append(f"Could not update {kind} {name}: {e}")
+                self._done("failed")
+                return
+        self._done("updated")
+
+    # Creation
+
+    def _role_settings(self, role):
+        return {
+            "permissions": discord.Permissions(role["permissions"]),
+            "color": discord.Color(role["color"]),
+            "hoist": role["hoist"],
+            "mentionable": role["mentionable"],
+        }
+
+    def _channel_settings(self, channel):
+        if channel["type"] == "text":
+            return {
+                "topic": channel["topic"],
+                "slowmode_delay": channel["slowmode_delay"],
+                "nsfw": channel["nsfw"],
+                "overwrites": self.remap_overwrites(channel["overwrites"]),
+            }
+        return {
+            "bitrate": min(channel["bitrate"], int(self.guild.bitrate_limit)),
+            "user_limit": channel["user_limit"],
+            "overwrites": self.remap_overwrites(channel["overwrites"]),
+        }
+
+    async def _create_role(self, role):
+        if self.incremental:
+            existing = self._existing_role(role)
+            if existing is not None:
+                self.role_mapping[role["id"]] = existing
+                await self._sync("role", role["name"], "roles", existing, self._role_settings(role))
+                return
+
+        async with self.routes["roles"]:
+            try:
+                new_role = await self.guild.create_role(name=role["name"], **self._role_settings(role))
+            except discord.HTTPException as e:
+                self._fail("role", role["name"], e)
+                return
+        self.role_mapping[role["id"]] = new_role
+        self._new_roles.add(new_role)
+        self._done()
+
+    async def _create_channel(self, channel, category=None):
+        settings = self._channel_settings(channel)
+        if self.incremental:
+            existing = self._existing_channel(channel, category)
+            if existing is not None:
+                await self._sync("channel", channel["name"], "channels", existing, settings)
+                return
+
+        async with self.routes["channels"]:
+            try:
+                if channel["type"] == "text":
+                    create = self.guild.create_text_channel
+                else:
+                    create = self.guild.create_voice_channel
+                await create(name=channel["name"], category=category, position=channel["position"], **settings)
+            except discord.HTTPException as e:
+                self._fail("channel", channel["name"], e)
+                return
+        self._done()
+
+    async def _create_category(self, category):
+        overwrites = self.remap_overwrites(category["overwrites"])
+        existing = self._existing_category(category) if self.incremental else None
+        if existing is not None:
+            new_category = existing
+            self.category_mapping[category["id"]] = existing
+            await self._sync("category", category["name"], "channels", existing, {"overwrites": overwrites})
+        else:
+            async with self.routes["channels"]:
+                try:
+                    new_category = await self.guild.create_category(
+                        name=category["name"],
+                        position=category["position"],
+                        overwrites=overwrites
+                    )
+                except discord.HTTPException as e:
+                    self._fail("category", category["name"], e)
+                    # Its channels are still created, just without a category
+                    new_category = None
+                else:
+                    self.category_mapping[category["id"]] = new_category
+                    self._done()
+
+        await asyncio.gather(*(
+            self._create_channel(channel, new_category)
+            for channel in self.plan.channels_by_category[category["id"]]
+        ))
+
+    async def run(self):
+        # Phase 1: roles (everything else may reference them)
+        await asyncio.gather(*(self._create_role(role) for role in self.plan.roles))
+
+        # Creation order isn't guaranteed when running in parallel; fix it in one request
+        ordered = [self.role_mapping[role["id"]] for role in self.plan.roles if role["id"] in self.role_mapping]
+        if self._new_roles:
+            positions = {role: len(ordered) - index for index, role in enumerate(ordered)}
+            try:
+                await self.guild.edit_role_positions(positions, reason="Server clone")
+            except discord.HTTPException as e:
+                self.errors.append(f"Could not reorder roles: {e}")
+
+        # Phase 2: categories, each followed by its own channels, plus uncategorized channels
+        await asyncio.gather(
+            *(self._create_category(category) for category in self.plan.categories),
+            *(self._create_channel(channel) for channel in self.plan.uncategorized)
+        )
+        return self
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+
+from atomic_file import atomic_write
+
+
+# Settings that belong to one guild. They live under "guilds" -> "<guild id>";
+# everything else in the file applies to the whole bot.
+GUILD_KEYS = (
+    "welcome_channel",
+    "role_selector",
+    "role_selectors",
+    "channel_selector",
+    "channel_selectors",
+    "registration_form",
+    "ticket_system",
+    "support_role_id",
+)
+
+
+class ConfigStore:
+    """Keeps bot_config.json in memory and writes it back in batches.
+
+    The file is read once at startup. Handlers read and mutate ``data``
+    directly and call ``save()``, which only schedules a flush: all changes
+    made within ``flush_delay`` seconds end up in a single atomic write
+    (temp file + rename). A background watcher reloads the file when it is
+    edited by hand while the bot is running.
+
+    Anything derived from the config (like the reaction-role table) can
+    register a listener with ``add_listener``; it is called with the config
+    after every ``save()`` and every reload.
+
+    Guild settings (``GUILD_KEYS``) are kept in a namespace per guild,
+    see ``guild()``.
+    """
+
+    def __init__(self, path="bot_config.json", flush_delay=1.0, reload_interval=2.0):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.reload_interval = reload_interval
+        self.data = {}
+        self._dirty = False
+        self._flush_handle = None
+        self._mtime = None
+        self._watch_task = None
+        self._listeners = []
+        self.load()
+
+    def add_listener(self, callback):
+        """Call ``callback(data)`` now and whenever the config changes"""
+        self._listeners.append(callback)
+        callback(self.data)
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback(self.data)
+            except Exception as e:
+                print(f"Error in config listener {callback}: {e}")
+
+    def guild(self, guild_id):
+        """The settings namespace of a guild, created on first use.
+
+        Mutate it and call ``save()`` like the rest of the config.
+        """
+        guilds = self.data.setdefault("guilds", {})
+        return guilds.setdefault(str(guild_id), {})
+
+    def guild_get(self, guild_id, key, default=None):
+        """Read a guild setting without creating the namespace"""
+        return self.data.get("guilds", {}).get(str(guild_id), {}).get(key, default)
+
+    def migrate_to_guilds(self, find_guild):
+        """Move settings from before guild namespaces into the guild they belong to.
+
+        ``find_guild(value)`` returns the ID of the guild a setting refers to
+        (from the channel or role IDs in it), or None. Settings it can't place
+        stay where they are. Returns True if anything moved.
+        """
+        moved = False
+        for key in GUILD_KEYS:
+            if key not in self.data:
+                continue
+            value = self.data[key]
+            # Lists (like role_selectors) may hold entries for several guilds
+            items = value if isinstance(value, list) else [value]
+            unplaced = []
+            for item in items:
+                guild_id = find_guild(item)
+                if guild_id is None:
+                    unplaced.append(item)
+                    continue
+                settings = self.guild(guild_id)
+                if isinstance(value, list):
+                    settings.setdefault(key, []).append(item)
+                else:
+                    settings.setdefault(key, item)
+                moved = True
+
+            if not unplaced:
+                del self.data[key]
+            elif isinstance(value, list):
+                self.data[key] = unplaced
+        return moved
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        """Read the file into memory, keeping the same dict object"""
+        data = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        self._mtime = self._file_mtime()
+
+        # Update in place so references held by running handlers stay valid
+        self.data.clear()
+        self.data.update(data)
+        self._notify()
+
+    def save(self):
+        """Mark the config as changed and schedule a batched write"""
+        self._dirty = True
+        self._notify()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (startup / shutdown): write straight away
+            self.flush()
+            return
+
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_delay, self._scheduled_flush)
+
+    def _scheduled_flush(self):
+        self._flush_handle = None
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"Error saving config: {e}")
+            # Try again on the next cycle instead of losing the changes
+            self.save()
+
+    def flush(self):
+        """Write pending changes to disk atomically"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+
+        with atomic_write(self.path, 'w') as f:
+            json.dump(self.data, f, indent=4)
+
+        self._dirty = False
+        self._mtime = self._file_mtime()
+
+    def check_for_changes(self):
+        """Reload the file if it was modified by someone else. Returns True on reload."""
+        mtime = self._file_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+
+        if self._dirty:
+            # Our pending write would clobber the edit anyway; keep memory as the source of truth
+            print("bot_config.json changed on disk while changes were pending; keeping in-memory config")
+            self._mtime = mtime
+            return False
+
+        try:
+            self.load()
+        except (OSError, json.JSONDecodeError) as e:
+            # Editor may still be writing the file; try again on the next poll
+            print(f"Could not reload bot_config.json: {e}")
+            return False
+
+        print("Reloaded bot_config.json")
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            self.check_for_changes()
+
+    def start_watching(self):
+        """Start polling the file for external edits"""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch())
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import discord
+
+from scheduling import DeadlineQueue
+
+
+class ConversationRouter:
+    """Keeps track of DM conversations the bot is waiting on, keyed by user ID.
+
+    Instead of one ``bot.wait_for`` per user (where every incoming message
+    is checked against every pending predicate), each DM is routed with a
+    single dict lookup on its author.
+
+    A flow is registered with a handler ``async handler(conversation, message)``
+    that returns the name of the next step to keep the conversation going
+    (its timeout starts again), or None when it is finished. An optional
+    ``on_timeout(conversation)`` is called when the user doesn't answer in
+    time. Conversations are stored in the database so a restart doesn't
+    lose them.
+    """
+
+    def __init__(self, storage, default_timeout=300):
+        self.storage = storage
+        self.default_timeout = default_timeout
+        self._flows = {}
+        self._pending = {}
+        self._expiries = DeadlineQueue()
+        self._task = None
+
+    def register(self, flow, handler, on_timeout=None):
+        self._flows[flow] = (handler, on_timeout)
+
+    def start(self, user_id, guild_id, flow, step="start", data=None, timeout=None):
+        """Wait for the user's next DM(s) in ``flow``. Replaces any conversation already pending."""
+        conversation = {
+            "user_id": user_id,
+            "guild_id": guild_id,
+            "flow": flow,
+            "step": step,
+            "data": data or {},
+            "timeout": timeout or self.default_timeout,
+        }
+        self._set_pending(conversation)
+        return conversation
+
+    def _set_pending(self, conversation):
+        conversation["expires_at"] = time.time() + conversation["timeout"]
+        self._pending[conversation["user_id"]] = conversation
+        self.storage.save_conversation(conversation)
+        self._expiries.push(conversation["expires_at"], conversation["user_id"])
+
+    def _finish(self, user_id):
+        if self._pending.pop(user_id, None) is not None:
+            self.storage.delete_conversation(user_id)
+
+    async def handle_message(self, message):
+        """Route a DM to its conversation. Returns True if it was consumed."""
+        conversation = self._pending.get(message.author.id)
+        if conversation is None:
+            return False
+
+        handler, _ = self._flows.get(conversation["flow"], (None, None))
+        if handler is None:
+            self._finish(message.author.id)
+            return False
+
+        # Take it out first so a second message can't run the same step twice
+        self._finish(message.author.id)
+        try:
+            next_step = await handler(conversation, message)
+        except discord.HTTPException as e:
+            print(f"Error in {conversation['flow']} conversation with {message.author}: {e}")
+            return True
+
+        if next_step is not None:
+            conversation["step"] = next_step
+            self._set_pending(conversation)
+        return True
+
+    def start_expiry(self):
+        """Load saved conversations and start expiring the ones nobody answers"""
+        if self._task is None or self._task.done():
+            for conversation in self.storage.list_conversations():
+                if conversation["user_id"] not in self._pending:
+                    self._pending[conversation["user_id"]] = conversation
+                    self._expiries.push(conversation["expires_at"], conversation["user_id"])
+            self._task = asyncio.create_task(self._expire())
+
+    async def _expire(self):
+        while True:
+            expires_at, user_id = await self._expiries.next()
+            conversation = self._pending.get(user_id)
+            # Skip entries for conversations that moved on or already ended
+            if conversation is None or conversation["expires_at"] != expires_at:
+                continue
+
+            self._finish(user_id)
+            _, on_timeout = self._flows.get(conversation["flow"], (None, None))
+            if on_timeout:
+                try:
+                    await on_timeout(conversation)
+                except discord.HTTPException:
+                    pass
@@ -0,0 +1,168 @@
+import asyncio
+import time
+
+import discord
+
+
+# Discord error code for "Cannot send messages to this user"
+CANNOT_DM_USER = 50007
+
+
+class DispatchStats:
+    """Counters for one mass DM run"""
+
+    def __init__(self, total=0):
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.rate_limited = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.sent + self.failed
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def throughput(self):
+        """Messages attempted per second"""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class DmDispatcher:
+    """Sends DMs with bounded concurrency and adaptive pacing.
+
+    Sends are spread out at ``rate`` messages per second across at most
+    ``concurrency`` in-flight requests. A 429 response pauses every worker
+    for the retry-after Discord asked for and halves the rate; slow
+    responses (discord.py waited out a rate limit internally) also slow us
+    down. After a run of clean sends the rate creeps back up towards
+    ``max_rate``.
+
+    Members whose DMs failed with "cannot send messages to this user" are
+    remembered and skipped on later runs.
+    """
+
+    def __init__(self, concurrency=5, rate=2.0, min_rate=0.2, max_rate=10.0,
+                 slow_response=2.0, max_retries=3):
+        self.concurrency = concurrency
+        self.initial_rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.slow_response = slow_response
+        self.max_retries = max_retries
+        self.undeliverable = set()
+        self.rate = rate
+        self._next_send = 0.0
+        self._paused_until = 0.0
+        self._clean_streak = 0
+
+    def should_skip(self, member):
+        return member.bot or member.system or member.id in self.undeliverable
+
+    async def _wait_turn(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self._next_send, self._paused_until)
+        self._next_send = start + 1 / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def _slow_down(self, retry_after=None):
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._clean_streak = 0
+        if retry_after:
+            loop = asyncio.get_running_loop()
+            self._paused_until = max(self._paused_until, loop.time() + retry_after)
+
+    def _speed_up(self):
+        self._clean_streak += 1
+        if self._clean_streak >= 10:
+            self.rate = min(self.max_rate, self.rate * 1.25)
+            self._clean_streak = 0
+
+    @staticmethod
+    def _retry_after(error):
+        if isinstance(error, discord.RateLimited):
+            return error.retry_after
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            return float(headers.get("Retry-After", 1.0))
+        except (TypeError, ValueError):
+            return 1.0
+
+    async def _send_one(self, member, content, stats):
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn()
+            started = time.monotonic()
+            try:
+                await member.send(content)
+            except discord.RateLimited as e:
+                stats.rate_limited += 1
+                self._slow_down(self._retry_after(e))
+                continue
+            except discord.Forbidden as e:
+                if e.code == CANNOT_DM_USER:
+                    self.undeliverable.add(member.id)
+                stats.failed += 1
+                return
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    stats.rate_limited += 1
+                    self._slow_down(self._retry_after(e))
+                    continue
+                stats.failed += 1
+                return
+
+            stats.sent += 1
+            if time.monotonic() - started > self.slow_response:
+                self._slow_down()
+            else:
+                self._speed_up()
+            return
+
+        # Gave up after repeated rate limits
+        stats.failed += 1
+
+    async def run(self, members, content, stats=None, on_progress=None):
+        """DM every member that can receive it. Returns the DispatchStats.
+
+        ``on_progress(stats)`` is called after every attempted send.
+        """
+        recipients = []
+        skipped = 0
+        for member in members:
+            if self.should_skip(member):
+                skipped += 1
+            else:
+                recipients.append(member)
+
+        if stats is None:
+            stats = DispatchStats()
+        stats.total = len(recipients)
+        stats.skipped = skipped
+        self.rate = self.initial_rate
+
+        queue = asyncio.Queue()
+        for member in recipients:
+            queue.put_nowait(member)
+
+        async def worker():
+            while True:
+                try:
+                    member = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._send_one(member, content, stats)
+                if on_progress:
+                    on_progress(stats)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(recipients)) or 1)))
+        stats.finished = time.monotonic()
+        return stats
@@ -0,0 +1,163 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+
+from storage import select_registrations, select_team_summary
+
+
+EXPORT_FORMATS = ("csv", "jsonl", "teams")
+
+REGISTRATION_HEADER = [
+    "Discord User ID",
+    "Discord Username",
+    "Provided Name",
+    "Team Name",
+    "Registration Date"
+]
+
+TEAM_SUMMARY_HEADER = ["Team Name", "Members", "First Registration", "Last Update"]
+
+# Room left under the upload limit for data still buffered in the compressor,
+# and how often (in lines) the size of the current part is checked
+PART_MARGIN = 256 * 1024
+SIZE_CHECK_EVERY = 256
+
+
+def parse_date(value, end=False):
+    """Turn ``YYYY-MM-DD`` (or a full ISO timestamp) into a bound for the date filters.
+
+    A bare date used as the end of a range includes that whole day.
+    """
+    if value is None:
+        return None
+    try:
+        moment = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date `{value}`, use YYYY-MM-DD")
+    if end and len(value) == 10:
+        moment += datetime.timedelta(days=1)
+    return moment.isoformat()
+
+
+def _csv_line(row):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()
+
+
+def iter_export_lines(conn, guild_id, fmt, team=None, since=None, until=None):
+    """Yield ``(line, is_row)`` for a guild's export, straight from a database cursor.
+
+    Header lines have ``is_row`` False so they can be repeated at the top of
+    every part.
+    """
+    if fmt == "csv":
+        yield _csv_line(REGISTRATION_HEADER), False
+        for row in select_registrations(conn, guild_id, team, since, until):
+            yield _csv_line([
+                row["user_id"],
+                row["user_discord_name"] or "",
+                row["provided_name"] or "",
+                row["team_name"] or "",
+                row["timestamp"] or ""
+            ]), True
+    elif fmt == "jsonl":
+        for row in select_registrations(conn, guild_id, team, since, until):
+            yield json.dumps(dict(row), ensure_ascii=False) + "\n", True
+    elif fmt == "teams":
+        yield _csv_line(TEAM_SUMMARY_HEADER), False
+        for row in select_team_summary(conn, guild_id, team, since, until):
+            yield _csv_line([
+                row["team_name"] or "",
+                row["members"],
+                row["first_registered"] or "",
+                row["last_updated"] or ""
+            ]), True
+    else:
+        raise ValueError(f"Unknown export format `{fmt}`")
+
+
+class _PartWriter:
+    """Writes lines to numbered files, starting a new one before ``max_bytes`` is reached"""
+
+    def __init__(self, directory, basename, extension, max_bytes, compress):
+        self.directory = directory
+        self.basename = basename
+        self.extension = extension + (".gz" if compress else "")
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.limit = max_bytes - min(PART_MARGIN, max_bytes // 4)
+        self.paths = []
+        self._raw = None
+        self._text = None
+        self._lines = 0
+
+    def _full(self):
+        self._lines += 1
+        if self._lines % SIZE_CHECK_EVERY:
+            return False
+        self._text.flush()
+        return self._raw.tell() >= self.limit
+
+    def _open(self):
+        path = os.path.join(self.directory, f"{self.basename}_part{len(self.paths) + 1}{self.extension}")
+        self._raw = open(path, "wb")
+        stream = gzip.GzipFile(fileobj=self._raw, mode="wb") if self.compress else self._raw
+        self._text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        self.paths.append(path)
+
+    def _close(self):
+        if self._text is not None:
+            self._text.close()  # Also closes the gzip stream
+            if not self._raw.closed:
+                self._raw.close()
+            self._text = self._raw = None
+
+    def write(self, line, header):
+        if self._text is None:
+            self._open()
+        elif self._full():
+            self._close()
+            self._open()
+            for header_line in header:
+                self._text.write(header_line)
+        self._text.write(line)
+
+    def finish(self):
+        self._close()
+        # With a single part there is no need for the suffix
+        if len(self.paths) == 1:
+            path = os.path.join(self.directory, f"{self.basename}{self.extension}")
+            os.replace(self.paths[0], path)
+            self.paths[0] = path
+        return self.paths
+
+
+def write_export(conn, guild_id, directory, basename, fmt, max_bytes, compress=False,
+                 team=None, since=None, until=None, on_progress=None, progress_every=1000):
+    """Stream a guild's export into one or more files no larger than ``max_bytes``.
+
+    Meant to run in a worker thread with its own connection: rows go from
+    the cursor to disk one at a time, so memory use doesn't depend on the
+    number of registrations. ``on_progress(rows)`` is called every
+    ``progress_every`` rows. Returns ``(paths, rows)``.
+    """
+    extension = ".jsonl" if fmt == "jsonl" else ".csv"
+    writer = _PartWriter(directory, basename, extension, max_bytes, compress)
+    header = []
+    rows = 0
+    try:
+        for line, is_row in iter_export_lines(conn, guild_id, fmt, team, since, until):
+            if not is_row:
+                header.append(line)
+            else:
+                rows += 1
+                if on_progress and rows % progress_every == 0:
+                    on_progress(rows)
+            writer.write(line, header)
+    finally:
+        paths = writer.finish()
+    return paths, rows
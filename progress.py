@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import discord
+
+from stats import format_duration
+
+
+class ProgressReporter:
+    """Shows the progress of a long-running command in a status message.
+
+    The command calls ``update()`` as often as it likes; that only records
+    the numbers. A background task edits the message at most once every
+    ``interval`` seconds, and only if something changed. Edits are never
+    queued or retried: if one is still in flight or fails, that update is
+    dropped and the interval is doubled, so status edits never hold up or
+    compete with the actual work.
+
+    Use it as an async context manager; the final state is written on exit.
+    """
+
+    def __init__(self, message, label, total=None, interval=5.0, max_interval=60.0):
+        self.message = message
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.errors = 0
+        self.note = None
+        self.interval = interval
+        self.max_interval = max_interval
+        self.started = time.monotonic()
+        self._dirty = True
+        self._task = None
+        self._edit_task = None
+
+    def update(self, done=None, total=None, errors=None, advance=0, failed=0, note=None):
+        """Record progress. Cheap; never touches Discord."""
+        if done is not None:
+            self.done = done
+        if total is not None:
+            self.total = total
+        if errors is not None:
+            self.errors = errors
+        self.done += advance
+        self.errors += failed
+        if note is not None:
+            self.note = note
+        self._dirty = True
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def render(self, finished=False):
+        parts = []
+        if self.total:
+            percent = round(self.done / self.total * 100) if self.total else 100
+            parts.append(f"{self.label}... {self.done}/{self.total} ({percent}%)")
+        else:
+            parts.append(f"{self.label}... {self.done}")
+        if self.done:
+            parts.append(f"{self.rate:.1f}/s")
+        if finished:
+            parts.append(f"took {format_duration(time.monotonic() - self.started)}")
+        elif self.total and self.rate > 0:
+            parts.append(f"ETA {format_duration((self.total - self.done) / self.rate)}")
+        if self.errors:
+            parts.append(f"{self.errors} errors")
+        if self.note:
+            parts.append(self.note)
+        return " • ".join(parts)
+
+    async def _edit(self, content):
+        try:
+            await self.message.edit(content=content)
+        except discord.HTTPException:
+            # Rate limited or failed: back off rather than retry
+            self.interval = min(self.interval * 2, self.max_interval)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            editing = self._edit_task is not None and not self._edit_task.done()
+            if self._dirty and not editing:
+                self._dirty = False
+                self._edit_task = asyncio.create_task(self._edit(self.render()))
+
+    async def __aenter__(self):
+        self.started = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._task.cancel()
+        if self._edit_task is not None:
+            # Let an in-flight edit land first so it can't overwrite the final state
+            await asyncio.gather(self._edit_task, return_exceptions=True)
+        if exc_type is not None:
+            self.note = "stopped by an error"
+        try:
+            await self.message.edit(content=self.render(finished=True))
+        except discord.HTTPException:
+            pass
+        return False
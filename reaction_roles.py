@@ -0,0 +1,164 @@
+import asyncio
+from collections import namedtuple
+
+import discord
+
+
+# What a reaction on a selector message does
+ReactionAction = namedtuple("ReactionAction", "kind role_id channel_id")
+
+CHANNEL_SELECT = "channel"
+PARTICIPANT = "participant"
+ORGANISATEUR = "organisateur"
+
+ROLE_SELECTOR_EMOJIS = {
+    "🔵": (PARTICIPANT, "participant_role_id"),
+    "🔴": (ORGANISATEUR, "organisateur_role_id"),
+}
+
+
+def emoji_key(emoji):
+    """Key used in the table: the id for custom emojis, the character otherwise"""
+    return str(emoji.id) if emoji.id else emoji.name
+
+
+def _as_list(config, single_key, list_key):
+    selectors = list(config.get(list_key, []))
+    if config.get(single_key):
+        selectors.append(config[single_key])
+    return selectors
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ReactionRoleTable:
+    """Maps (message_id, emoji) to the action a reaction should trigger.
+
+    Built once from the config (``channel_selector`` / ``channel_selectors``
+    and ``role_selector`` / ``role_selectors`` in every guild's settings)
+    and rebuilt whenever the config changes, so reaction events don't have
+    to parse the config. Message IDs are unique across guilds, so one table
+    serves all of them.
+    Reactions on any other message are rejected by the first dict lookup.
+    """
+
+    def __init__(self):
+        self._messages = {}
+
+    def rebuild(self, config):
+        messages = {}
+        # Settings not yet moved into a guild namespace still count
+        for settings in [config, *config.get("guilds", {}).values()]:
+            self._add_selectors(messages, settings)
+
+        # Swap in the new table in one step
+        self._messages = messages
+
+    def _add_selectors(self, messages, config):
+        for selector in _as_list(config, "channel_selector", "channel_selectors"):
+            message_id = _to_int(selector.get("message_id"))
+            if message_id is None:
+                continue
+            actions = messages.setdefault(message_id, {})
+            for key, pair in selector.get("emoji_role_pairs", {}).items():
+                role_id = _to_int(pair.get("role_id"))
+                if role_id is not None:
+                    actions[str(key)] = ReactionAction(CHANNEL_SELECT, role_id, _to_int(pair.get("channel_id")))
+
+        for selector in _as_list(config, "role_selector", "role_selectors"):
+            message_id = _to_int(selector.get("message_id"))
+            if message_id is None:
+                continue
+            actions = messages.setdefault(message_id, {})
+            for emoji, (kind, role_key) in ROLE_SELECTOR_EMOJIS.items():
+                role_id = _to_int(selector.get(role_key))
+                if role_id is not None:
+                    actions[emoji] = ReactionAction(kind, role_id, None)
+
+    def lookup(self, message_id, emoji):
+        """Return the ReactionAction for a reaction, or None if it isn't a selector reaction"""
+        actions = self._messages.get(message_id)
+        if actions is None:
+            return None
+        return actions.get(emoji_key(emoji))
+
+
+class RoleMutationQueue:
+    """Batches role changes per member into a single member edit.
+
+    Adds and removes queued for the same member within ``window`` seconds
+    are merged: the last change for a role wins, so an add followed by a
+    remove cancels out. When the window closes the net result is applied
+    with one ``member.edit(roles=...)`` call (none if nothing changed), and
+    the confirmations for roles that were really added go out as one DM.
+    """
+
+    def __init__(self, window=1.5):
+        self.window = window
+        self._pending = {}
+        self._tasks = set()
+
+    def queue(self, member, role, add, reason, confirmation=None):
+        key = (member.guild.id, member.id)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = {"guild": member.guild, "member_id": member.id, "changes": {}, "reasons": []}
+            self._pending[key] = pending
+            loop = asyncio.get_running_loop()
+            loop.call_later(self.window, self._flush, key)
+
+        pending["changes"][role.id] = (add, role, confirmation)
+        if reason not in pending["reasons"]:
+            pending["reasons"].append(reason)
+
+    def add(self, member, role, reason, confirmation=None):
+        self.queue(member, role, True, reason, confirmation)
+
+    def remove(self, member, role, reason):
+        self.queue(member, role, False, reason)
+
+    def _flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending:
+            task = asyncio.create_task(self._apply(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _apply(self, pending):
+        member = pending["guild"].get_member(pending["member_id"])
+        if member is None:
+            return  # Left the server in the meantime
+
+        current = {role.id: role for role in member.roles if not role.is_default()}
+        desired = dict(current)
+        confirmations = []
+        for role_id, (add, role, confirmation) in pending["changes"].items():
+            if add:
+                desired[role_id] = role
+                if role_id not in current and confirmation:
+                    confirmations.append(confirmation)
+            else:
+                desired.pop(role_id, None)
+
+        if desired.keys() == current.keys():
+            return
+
+        try:
+            await member.edit(roles=list(desired.values()), reason="; ".join(pending["reasons"]))
+        except discord.Forbidden:
+            print(f"Missing permissions to update roles for {member}")
+            return
+        except discord.HTTPException as e:
+            print(f"Error updating roles for {member}: {e}")
+            return
+
+        if confirmations:
+            try:
+                await member.send("\n".join(confirmations))
+            except discord.Forbidden:
+                pass  # Can't DM user
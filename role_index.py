@@ -0,0 +1,84 @@
+import asyncio
+
+
+class RoleIndex:
+    """Name -> role lookup per guild, with single-flight role creation.
+
+    ``discord.utils.get(guild.roles, name=...)`` scans every role. The index
+    is built once per guild and kept current from the role create, update
+    and delete events. ``get_or_create`` makes sure that concurrent requests
+    for the same missing name share one ``create_role`` call instead of
+    creating duplicates.
+    """
+
+    def __init__(self):
+        self._guilds = {}
+        self._inflight = {}
+
+    def _names(self, guild):
+        names = self._guilds.get(guild.id)
+        if names is None:
+            names = {}
+            # Same precedence as discord.utils.get: the first role in guild.roles wins
+            for role in guild.roles:
+                names.setdefault(role.name, role)
+            self._guilds[guild.id] = names
+        return names
+
+    def _reindex_name(self, guild, name):
+        names = self._guilds.get(guild.id)
+        if names is None:
+            return
+        role = next((role for role in guild.roles if role.name == name), None)
+        if role is None:
+            names.pop(name, None)
+        else:
+            names[name] = role
+
+    def get(self, guild, name):
+        return self._names(guild).get(name)
+
+    def invalidate(self, guild_id=None):
+        """Forget a guild's index (or all of them); it is rebuilt on the next lookup"""
+        if guild_id is None:
+            self._guilds.clear()
+        else:
+            self._guilds.pop(guild_id, None)
+
+    # Event hooks
+
+    def role_created(self, role):
+        names = self._guilds.get(role.guild.id)
+        if names is not None:
+            self._reindex_name(role.guild, role.name)
+
+    def role_updated(self, before, after):
+        if before.name != after.name:
+            self._reindex_name(after.guild, before.name)
+        self._reindex_name(after.guild, after.name)
+
+    def role_deleted(self, role):
+        self._reindex_name(role.guild, role.name)
+
+    async def get_or_create(self, guild, name, **kwargs):
+        """Return (role, created). Extra arguments are passed to ``guild.create_role``."""
+        role = self.get(guild, name)
+        if role is not None:
+            return role, False
+
+        key = (guild.id, name)
+        task = self._inflight.get(key)
+        if task is not None:
+            # Someone is already creating this role; wait for theirs
+            return await asyncio.shield(task), False
+
+        task = asyncio.ensure_future(guild.create_role(name=name, **kwargs))
+        self._inflight[key] = task
+        try:
+            role = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+
+        # Don't wait for the gateway event before later lookups can see it
+        self._names(guild)[name] = role
+        return role, True
@@ -0,0 +1,40 @@
+import asyncio
+import heapq
+import time
+
+
+class DeadlineQueue:
+    """Keys ordered by deadline, for a background loop that handles each one when it comes due.
+
+    The loop awaits ``next()``, which sleeps until the earliest deadline and
+    wakes up early if an earlier one is pushed meanwhile. A key may be
+    pushed again with a new deadline; the old entry is still returned, so
+    callers compare the deadline with their own state and skip stale ones.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._wakeup = asyncio.Event()
+
+    def push(self, due, key):
+        heapq.heappush(self._heap, (due, key))
+        self._wakeup.set()
+
+    async def next(self):
+        """Wait for the earliest deadline to pass, then return ``(due, key)``"""
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            due, key = self._heap[0]
+            delay = due - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            return heapq.heappop(self._heap)
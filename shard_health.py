@@ -0,0 +1,70 @@
+import time
+
+
+class ShardHealth:
+    """Connection state of each shard, tracked from gateway events.
+
+    With ``commands.AutoShardedBot`` every shard reports on its own through
+    the ``on_shard_*`` events; a plain ``commands.Bot`` is shard 0 and
+    reports through ``on_connect`` / ``on_disconnect`` / ``on_resumed``.
+    """
+
+    def __init__(self):
+        self._shards = {}
+
+    def _shard(self, shard_id):
+        shard_id = shard_id or 0
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            shard = {"state": "starting", "since": time.time(), "connects": 0, "disconnects": 0, "resumes": 0}
+            self._shards[shard_id] = shard
+        return shard
+
+    def _set_state(self, shard_id, state):
+        shard = self._shard(shard_id)
+        if shard["state"] != state:
+            shard["state"] = state
+            shard["since"] = time.time()
+        return shard
+
+    def connected(self, shard_id):
+        self._set_state(shard_id, "connected")["connects"] += 1
+
+    def ready(self, shard_id):
+        self._set_state(shard_id, "ready")
+
+    def resumed(self, shard_id):
+        self._set_state(shard_id, "ready")["resumes"] += 1
+
+    def disconnected(self, shard_id):
+        self._set_state(shard_id, "disconnected")["disconnects"] += 1
+
+    def report(self, bot):
+        """One dict per shard: state, seconds in that state, latency, guild count and counters"""
+        if hasattr(bot, "latencies"):
+            latencies = dict(bot.latencies)
+        else:
+            latencies = {0: bot.latency}
+
+        guilds = {}
+        for guild in bot.guilds:
+            shard_id = guild.shard_id or 0
+            guilds[shard_id] = guilds.get(shard_id, 0) + 1
+
+        now = time.time()
+        report = []
+        for shard_id in sorted(set(self._shards) | set(latencies)):
+            shard = self._shard(shard_id)
+            latency = latencies.get(shard_id)
+            report.append({
+                "shard_id": shard_id,
+                "state": shard["state"],
+                "for_seconds": max(0.0, now - shard["since"]),
+                # discord.py reports inf until the first heartbeat is acknowledged
+                "latency_ms": round(latency * 1000) if latency is not None and latency != float("inf") else None,
+                "guilds": guilds.get(shard_id, 0),
+                "connects": shard["connects"],
+                "disconnects": shard["disconnects"],
+                "resumes": shard["resumes"],
+            })
+        return report
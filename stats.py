@@ -0,0 +1,86 @@
+import datetime
+import math
+
+
+# Close latencies are counted in geometric buckets: bucket n holds
+# [LATENCY_BASE ** n, LATENCY_BASE ** (n + 1)) seconds, so any quantile read
+# back from the histogram is within 10% of the real value.
+LATENCY_BASE = 1.2
+
+# Coarser ranges for display
+LATENCY_BANDS = [
+    (15 * 60, "< 15 min"),
+    (60 * 60, "15 min – 1 h"),
+    (4 * 60 * 60, "1 – 4 h"),
+    (24 * 60 * 60, "4 – 24 h"),
+    (None, "> 1 day"),
+]
+
+
+def hour_key(timestamp):
+    """``YYYY-MM-DDTHH`` bucket for an ISO timestamp, or None"""
+    if not timestamp or len(timestamp) < 13:
+        return None
+    return timestamp[:13]
+
+
+def latency_bucket(seconds):
+    if seconds < LATENCY_BASE:
+        return 0
+    return int(math.log(seconds, LATENCY_BASE))
+
+
+def bucket_bounds(bucket):
+    low = 0.0 if bucket == 0 else LATENCY_BASE ** bucket
+    return low, LATENCY_BASE ** (bucket + 1)
+
+
+def ticket_latency(ticket, closed_at):
+    """Seconds between a ticket being opened and ``closed_at`` (ISO strings), or None"""
+    try:
+        opened = datetime.datetime.fromisoformat(ticket["opened_at"])
+        closed = datetime.datetime.fromisoformat(closed_at)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return max((closed - opened).total_seconds(), 0.0)
+
+
+def histogram_quantile(histogram, q):
+    """Approximate quantile (0..1) of a {bucket: count} latency histogram, or None if empty"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= rank:
+            low, high = bucket_bounds(bucket)
+            return math.sqrt(low * high) if low else high / 2
+    return bucket_bounds(max(histogram))[1]
+
+
+def latency_bands(histogram):
+    """Sum the histogram into LATENCY_BANDS, returned as [(label, count)]"""
+    counts = [0] * len(LATENCY_BANDS)
+    for bucket, count in histogram.items():
+        low, _ = bucket_bounds(bucket)
+        for index, (limit, _) in enumerate(LATENCY_BANDS):
+            if limit is None or low < limit:
+                counts[index] += count
+                break
+    return [(label, count) for (_, label), count in zip(LATENCY_BANDS, counts)]
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes = rest // 60
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m"
+    return f"{seconds}s"
@@ -0,0 +1,781 @@
+import asyncio
+import json
+import pathlib
+import sqlite3
+
+from stats import hour_key, latency_bucket, ticket_latency
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS registrations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id INTEGER NOT NULL DEFAULT 0,
+    user_id INTEGER NOT NULL,
+    user_discord_name TEXT,
+    provided_name TEXT,
+    team_name TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_registrations_user ON registrations(user_id);
+CREATE INDEX IF NOT EXISTS idx_registrations_team ON registrations(team_name);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL DEFAULT 0,
+    creator_id INTEGER NOT NULL,
+    channel_id INTEGER,
+    subject TEXT,
+    opened_at TEXT,
+    closed INTEGER NOT NULL DEFAULT 0,
+    closed_by INTEGER,
+    closed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_creator ON tickets(creator_id, closed);
+CREATE INDEX IF NOT EXISTS idx_tickets_channel ON tickets(channel_id);
+CREATE INDEX IF NOT EXISTS idx_tickets_closed ON tickets(closed);
+
+CREATE TABLE IF NOT EXISTS channel_deletions (
+    channel_id INTEGER PRIMARY KEY,
+    ticket_id INTEGER,
+    reason TEXT,
+    due_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+
+CREATE TABLE IF NOT EXISTS spare_channels (
+    channel_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    created_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS timers (
+    timer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    author_name TEXT,
+    started_at REAL NOT NULL,
+    ends_at REAL NOT NULL,
+    phase INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    user_id INTEGER PRIMARY KEY,
+    guild_id INTEGER,
+    flow TEXT NOT NULL,
+    step TEXT NOT NULL,
+    data TEXT,
+    timeout REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Derived from the registrations history, so they can be dropped and rebuilt
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS registrants (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    user_discord_name TEXT,
+    provided_name TEXT,
+    team_name TEXT,
+    registered_at TEXT,
+    updated_at TEXT,
+    submissions INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_registrants_team ON registrants(guild_id, team_name);
+CREATE INDEX IF NOT EXISTS idx_registrants_registered ON registrants(guild_id, registered_at);
+
+CREATE TABLE IF NOT EXISTS teams (
+    guild_id INTEGER NOT NULL,
+    team_name TEXT NOT NULL,
+    member_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, team_name)
+);
+
+CREATE TABLE IF NOT EXISTS registration_hours (
+    guild_id INTEGER NOT NULL,
+    hour TEXT NOT NULL,
+    registrations INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, hour)
+);
+"""
+
+TICKET_STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ticket_latency (
+    guild_id INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    tickets INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, bucket)
+);
+"""
+
+# Bumped when the tables derived from the registration history change,
+# so they are rebuilt from it once
+LEDGER_VERSION = 3
+
+# Rows stored before data was kept per guild. They are assigned to the guild
+# when the bot turns out to be in only one (see Storage.adopt_unscoped).
+UNSCOPED = 0
+
+
+def _to_int(value):
+    return int(value) if value not in (None, "") else None
+
+
+def _registration_filters(guild_id, team=None, since=None, until=None):
+    clauses, params = ["guild_id = ?"], [guild_id]
+    if team is not None:
+        clauses.append("team_name = ?")
+        params.append(team)
+    if since is not None:
+        clauses.append("updated_at >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("updated_at < ?")
+        params.append(until)
+    return f"WHERE {' AND '.join(clauses)} ", params
+
+
+def select_registrations(conn, guild_id, team=None, since=None, until=None):
+    """Cursor over a guild's current registrations in signup order, optionally filtered.
+
+    ``since`` / ``until`` are ISO timestamps compared with the latest submission.
+    """
+    where, params = _registration_filters(guild_id, team, since, until)
+    return conn.execute(
+        "SELECT user_id, user_discord_name, provided_name, team_name, updated_at AS timestamp "
+        f"FROM registrants {where}ORDER BY registered_at, user_id",
+        params
+    )
+
+
+def select_team_summary(conn, guild_id, team=None, since=None, until=None):
+    """Cursor over one row per team of a guild: member count and first/last submission"""
+    where, params = _registration_filters(guild_id, team, since, until)
+    return conn.execute(
+        "SELECT team_name, COUNT(*) AS members, MIN(registered_at) AS first_registered, "
+        "MAX(updated_at) AS last_updated "
+        f"FROM registrants {where}GROUP BY team_name ORDER BY members DESC, team_name",
+        params
+    )
+
+
+def select_closed_tickets(conn, closed_before):
+    """Cursor over tickets closed before an ISO timestamp, oldest first"""
+    return conn.execute(
+        "SELECT * FROM tickets WHERE closed = 1 AND closed_at < ? ORDER BY ticket_id",
+        (closed_before,)
+    )
+
+
+class Storage:
+    """SQLite (WAL mode) store for registrations and tickets.
+
+    These used to live in bot_config.json, which meant the whole file was
+    rewritten on every submission. Each write here only touches the rows
+    involved, so the cost stays the same however many records there are.
+
+    Open tickets are also indexed in memory by creator and by channel, so
+    the ticket buttons never have to look at closed history.
+
+    Aggregates for the ``stats`` command (members per team, new
+    registrations per hour, ticket close-time histogram) are updated in the
+    same transaction as the change they count and mirrored in memory, so
+    reading them never scans history.
+
+    Registrations, tickets and their aggregates are kept per guild.
+
+    Registrations are a ledger keyed by guild and user: ``registrants`` holds each
+    user's current entry, ``registrations`` every submission (the history
+    of team changes) and ``teams`` the member count per team. Submissions
+    are queued and committed in groups: everything submitted within
+    ``commit_delay`` seconds (or ``max_batch`` submissions) goes to disk in
+    one transaction, so a burst costs one durable write instead of dozens.
+    Only those group commits are synced to disk (``synchronous=FULL``);
+    other writes keep the WAL default of ``synchronous=NORMAL``.
+    """
+
+    def __init__(self, path="bot_data.db", commit_delay=0.05, max_batch=500):
+        self.path = path
+        self.commit_delay = commit_delay
+        self.max_batch = max_batch
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._add_column("registrations", "guild_id", "INTEGER NOT NULL DEFAULT 0")
+        self._add_column("tickets", "guild_id", "INTEGER NOT NULL DEFAULT 0")
+        self.conn.commit()
+        self._pending_registrations = []
+        self._pending_registrants = {}
+        self._commit_handle = None
+        self._load_registration_index()
+        self._load_ticket_index()
+
+    def close(self):
+        self.flush_registrations()
+        self.conn.close()
+
+    def _add_column(self, table, column, definition):
+        """Add a column to a table created by an older version"""
+        columns = [row["name"] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+        if columns and column not in columns:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    # Meta
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value))
+        )
+
+    # Migration
+
+    def migrate_from_config(self, config):
+        """Move registrations and tickets out of the JSON config (one time).
+
+        Returns True if the config was changed and needs saving.
+        """
+        registrations = config.get("registrations")
+        tickets = config.get("tickets")
+        if registrations is None and tickets is None:
+            return False
+
+        # If a previous run already copied the rows but crashed before the
+        # config was saved, just drop the keys instead of inserting twice
+        if self.get_meta("json_migrated") is None:
+            with self.conn:
+                for reg in registrations or []:
+                    self._insert_registration(reg)
+                    self._upsert_registrant(reg)
+                for ticket_id, ticket in (tickets or {}).items():
+                    self._insert_ticket(
+                        int(ticket_id),
+                        UNSCOPED,
+                        ticket.get("creator_id"),
+                        ticket.get("channel_id"),
+                        ticket.get("subject"),
+                        ticket.get("opened_at"),
+                        closed=ticket.get("closed", False),
+                        closed_by=ticket.get("closed_by"),
+                        closed_at=ticket.get("closed_at")
+                    )
+                    # The histogram was built when the store opened, before these existed
+                    if ticket.get("closed"):
+                        self._count_latency(
+                            {"guild_id": UNSCOPED, "opened_at": ticket.get("opened_at")}, ticket.get("closed_at")
+                        )
+                self.set_meta("json_migrated", 1)
+            self._load_registration_index()
+            self._load_ticket_index()
+            print(f"Migrated {len(registrations or [])} registrations and {len(tickets or {})} tickets to {self.path}")
+
+        config.pop("registrations", None)
+        config.pop("tickets", None)
+        return True
+
+    def adopt_unscoped(self, guild_id):
+        """Assign rows stored before data was kept per guild to ``guild_id``.
+
+        Only safe when the bot is in a single guild. Returns True if anything moved.
+        """
+        self.flush_registrations()
+        registrations = self.conn.execute("SELECT 1 FROM registrations WHERE guild_id = ? LIMIT 1", (UNSCOPED,)).fetchone()
+        tickets = self.conn.execute("SELECT 1 FROM tickets WHERE guild_id = ? LIMIT 1", (UNSCOPED,)).fetchone()
+        latency = self.conn.execute("SELECT 1 FROM ticket_latency WHERE guild_id = ? LIMIT 1", (UNSCOPED,)).fetchone()
+        if not (registrations or tickets or latency):
+            return False
+
+        with self.conn:
+            self.conn.execute("UPDATE registrations SET guild_id = ? WHERE guild_id = ?", (guild_id, UNSCOPED))
+            self.conn.execute("UPDATE tickets SET guild_id = ? WHERE guild_id = ?", (guild_id, UNSCOPED))
+            self.conn.execute(
+                "INSERT INTO ticket_latency (guild_id, bucket, tickets) "
+                "SELECT ?, bucket, tickets FROM ticket_latency WHERE guild_id = ? AND true "
+                "ON CONFLICT(guild_id, bucket) DO UPDATE SET tickets = tickets + excluded.tickets",
+                (guild_id, UNSCOPED)
+            )
+            self.conn.execute("DELETE FROM ticket_latency WHERE guild_id = ?", (UNSCOPED,))
+            self.set_meta("registrants_built", 0)  # Rebuild the ledger under the new guild
+        self._load_registration_index()
+        self._load_ticket_index()
+        return True
+
+    # Registrations
+
+    def _insert_registration(self, reg):
+        self.conn.execute(
+            "INSERT INTO registrations (guild_id, user_id, user_discord_name, provided_name, team_name, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                _to_int(reg.get("guild_id")) or UNSCOPED,
+                _to_int(reg.get("user_id")),
+                reg.get("user_discord_name"),
+                reg.get("provided_name"),
+                reg.get("team_name"),
+                reg.get("timestamp")
+            )
+        )
+
+    def _upsert_registrant(self, reg):
+        """Make ``reg`` the user's current registration and keep the team counts in step"""
+        guild_id = _to_int(reg.get("guild_id")) or UNSCOPED
+        user_id = _to_int(reg.get("user_id"))
+        team_name = reg.get("team_name")
+        row = self.conn.execute(
+            "SELECT team_name FROM registrants WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+        ).fetchone()
+        self.conn.execute(
+            "INSERT INTO registrants (guild_id, user_id, user_discord_name, provided_name, team_name, registered_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(guild_id, user_id) DO UPDATE SET "
+            "user_discord_name = excluded.user_discord_name, provided_name = excluded.provided_name, "
+            "team_name = excluded.team_name, updated_at = excluded.updated_at, submissions = submissions + 1",
+            (
+                guild_id,
+                user_id,
+                reg.get("user_discord_name"),
+                reg.get("provided_name"),
+                team_name,
+                reg.get("timestamp"),
+                reg.get("timestamp")
+            )
+        )
+
+        hour = hour_key(reg.get("timestamp"))
+        if row is None and hour is not None:
+            self.conn.execute(
+                "INSERT INTO registration_hours (guild_id, hour, registrations) VALUES (?, ?, 1) "
+                "ON CONFLICT(guild_id, hour) DO UPDATE SET registrations = registrations + 1",
+                (guild_id, hour)
+            )
+
+        previous_team = row["team_name"] if row else None
+        if row is not None and previous_team == team_name:
+            return
+        if row is not None:
+            self.conn.execute(
+                "UPDATE teams SET member_count = member_count - 1 WHERE guild_id = ? AND team_name = ?",
+                (guild_id, previous_team)
+            )
+            self.conn.execute(
+                "DELETE FROM teams WHERE guild_id = ? AND team_name = ? AND member_count <= 0",
+                (guild_id, previous_team)
+            )
+        self.conn.execute(
+            "INSERT INTO teams (guild_id, team_name, member_count) VALUES (?, ?, 1) "
+            "ON CONFLICT(guild_id, team_name) DO UPDATE SET member_count = member_count + 1",
+            (guild_id, team_name)
+        )
+
+    def _load_registration_index(self):
+        # Databases from before the ledger only have the submission history;
+        # replay it once to build the current registrations
+        if self.get_meta("registrants_built") != str(LEDGER_VERSION):
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS registrants; DROP TABLE IF EXISTS teams; DROP TABLE IF EXISTS registration_hours;"
+                + LEDGER_SCHEMA
+            )
+            with self.conn:
+                for row in self.conn.execute("SELECT * FROM registrations ORDER BY id").fetchall():
+                    self._upsert_registrant(dict(row))
+                self.set_meta("registrants_built", LEDGER_VERSION)
+
+        self._team_counts = {}
+        for row in self.conn.execute("SELECT guild_id, team_name, member_count FROM teams"):
+            self._team_counts.setdefault(row["guild_id"], {})[row["team_name"]] = row["member_count"]
+        self._registrant_counts = {
+            guild_id: sum(teams.values()) for guild_id, teams in self._team_counts.items()
+        }
+        self._hourly = {}
+        for row in self.conn.execute("SELECT guild_id, hour, registrations FROM registration_hours"):
+            self._hourly.setdefault(row["guild_id"], {})[row["hour"]] = row["registrations"]
+
+    def submit_registration(self, reg):
+        """Queue a registration and return the team the user was in before (or None).
+
+        The team counts are updated straight away; the rows are written by
+        the next group commit.
+        """
+        guild_id = _to_int(reg.get("guild_id")) or UNSCOPED
+        user_id = _to_int(reg.get("user_id"))
+        team_name = reg.get("team_name")
+        previous = self.get_registration(guild_id, user_id)
+        previous_team = previous["team_name"] if previous else None
+
+        self._pending_registrations.append(reg)
+        self._pending_registrants[(guild_id, user_id)] = reg
+        team_counts = self._team_counts.setdefault(guild_id, {})
+        if previous is None:
+            self._registrant_counts[guild_id] = self._registrant_counts.get(guild_id, 0) + 1
+            hour = hour_key(reg.get("timestamp"))
+            if hour is not None:
+                hourly = self._hourly.setdefault(guild_id, {})
+                hourly[hour] = hourly.get(hour, 0) + 1
+        if previous is None or previous_team != team_name:
+            if previous is not None:
+                team_counts[previous_team] -= 1
+                if team_counts[previous_team] <= 0:
+                    del team_counts[previous_team]
+            team_counts[team_name] = team_counts.get(team_name, 0) + 1
+
+        if len(self._pending_registrations) >= self.max_batch:
+            self.flush_registrations()
+        elif self._commit_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush_registrations()
+            else:
+                self._commit_handle = loop.call_later(self.commit_delay, self._scheduled_flush)
+        return previous_team
+
+    def _scheduled_flush(self):
+        self._commit_handle = None
+        try:
+            self.flush_registrations()
+        except sqlite3.Error as e:
+            print(f"Error saving registrations: {e}")
+            # The batch is still queued; try again on the next cycle
+            self._commit_handle = asyncio.get_running_loop().call_later(self.commit_delay, self._scheduled_flush)
+
+    def flush_registrations(self):
+        """Write every queued registration in a single transaction"""
+        if self._commit_handle is not None:
+            self._commit_handle.cancel()
+            self._commit_handle = None
+        if not self._pending_registrations:
+            return
+
+        # If the transaction fails nothing is dequeued, so the batch is kept
+        self.conn.execute("PRAGMA synchronous=FULL")
+        try:
+            with self.conn:
+                for reg in self._pending_registrations:
+                    self._insert_registration(reg)
+                    self._upsert_registrant(reg)
+        finally:
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._pending_registrations = []
+        self._pending_registrants.clear()
+
+    def get_registration(self, guild_id, user_id):
+        """The user's current registration in a guild, including ones not committed yet"""
+        pending = self._pending_registrants.get((guild_id, user_id))
+        if pending is not None:
+            return {
+                "user_id": user_id,
+                "user_discord_name": pending.get("user_discord_name"),
+                "provided_name": pending.get("provided_name"),
+                "team_name": pending.get("team_name"),
+                "timestamp": pending.get("timestamp")
+            }
+        row = self.conn.execute(
+            "SELECT user_id, user_discord_name, provided_name, team_name, updated_at AS timestamp "
+            "FROM registrants WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def team_counts(self, guild_id):
+        """Members per team in a guild, kept up to date on every submission"""
+        return dict(self._team_counts.get(guild_id, {}))
+
+    def registrations_per_hour(self, guild_id, hours=24):
+        """New registrations for the latest ``hours`` hour buckets, oldest first"""
+        return sorted(self._hourly.get(guild_id, {}).items())[-hours:]
+
+    def count_registrations(self, guild_id):
+        return self._registrant_counts.get(guild_id, 0)
+
+    def open_reader(self):
+        """A separate read-only connection, for reading from a worker thread.
+
+        WAL mode lets it read while the bot keeps writing through ``conn``.
+        Commit queued registrations first so the reader sees them.
+        """
+        self.flush_registrations()
+        uri = pathlib.Path(self.path).absolute().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # Tickets
+
+    def _insert_ticket(self, ticket_id, guild_id, creator_id, channel_id, subject, opened_at,
+                       closed=False, closed_by=None, closed_at=None):
+        self.conn.execute(
+            "INSERT INTO tickets (ticket_id, guild_id, creator_id, channel_id, subject, opened_at, closed, closed_by, closed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                ticket_id,
+                guild_id,
+                _to_int(creator_id),
+                _to_int(channel_id),
+                subject,
+                opened_at,
+                1 if closed else 0,
+                _to_int(closed_by),
+                closed_at
+            )
+        )
+
+    def _load_ticket_index(self):
+        self._open_tickets = {}
+        self._open_by_creator = {}
+        self._open_by_channel = {}
+        rows = self.conn.execute("SELECT * FROM tickets WHERE closed = 0 ORDER BY ticket_id").fetchall()
+        for row in rows:
+            self._index_ticket(dict(row, closed=False))
+
+        # Ticket numbers are handed out from a persisted counter rather than
+        # derived from the number of tickets, so they never repeat
+        max_id = self.conn.execute("SELECT COALESCE(MAX(ticket_id), 0) FROM tickets").fetchone()[0]
+        self._next_ticket_id = max(int(self.get_meta("next_ticket_id", 1)), max_id + 1)
+
+        # The histogram predates per-guild data: keep its counts (archived
+        # tickets can't be recounted) under the unscoped guild
+        columns = [row["name"] for row in self.conn.execute("PRAGMA table_info(ticket_latency)")]
+        if columns and "guild_id" not in columns:
+            self.conn.executescript(
+                "ALTER TABLE ticket_latency RENAME TO ticket_latency_old;"
+                + TICKET_STATS_SCHEMA
+                + f"INSERT INTO ticket_latency (guild_id, bucket, tickets) SELECT {UNSCOPED}, bucket, tickets FROM ticket_latency_old;"
+                "DROP TABLE ticket_latency_old;"
+            )
+        self.conn.executescript(TICKET_STATS_SCHEMA)
+
+        # Tickets closed before the histogram existed are counted once
+        if self.get_meta("ticket_latency_built") is None:
+            with self.conn:
+                self.conn.execute("DELETE FROM ticket_latency")
+                for row in self.conn.execute("SELECT guild_id, opened_at, closed_at FROM tickets WHERE closed = 1"):
+                    self._count_latency(dict(row), row["closed_at"])
+                self.set_meta("ticket_latency_built", 1)
+        self._latency = {}
+        for row in self.conn.execute("SELECT guild_id, bucket, tickets FROM ticket_latency"):
+            self._latency.setdefault(row["guild_id"], {})[row["bucket"]] = row["tickets"]
+
+    def _count_latency(self, ticket, closed_at):
+        seconds = ticket_latency(ticket, closed_at)
+        if seconds is None:
+            return None
+        bucket = latency_bucket(seconds)
+        self.conn.execute(
+            "INSERT INTO ticket_latency (guild_id, bucket, tickets) VALUES (?, ?, 1) "
+            "ON CONFLICT(guild_id, bucket) DO UPDATE SET tickets = tickets + 1",
+            (ticket["guild_id"], bucket)
+        )
+        return bucket
+
+    def _index_ticket(self, ticket):
+        self._open_tickets[ticket["ticket_id"]] = ticket
+        self._open_by_creator[(ticket["guild_id"], ticket["creator_id"])] = ticket["ticket_id"]
+        if ticket["channel_id"] is not None:
+            self._open_by_channel[ticket["channel_id"]] = ticket["ticket_id"]
+
+    def _unindex_ticket(self, ticket):
+        self._open_tickets.pop(ticket["ticket_id"], None)
+        key = (ticket["guild_id"], ticket["creator_id"])
+        if self._open_by_creator.get(key) == ticket["ticket_id"]:
+            del self._open_by_creator[key]
+        if self._open_by_channel.get(ticket["channel_id"]) == ticket["ticket_id"]:
+            del self._open_by_channel[ticket["channel_id"]]
+
+    def allocate_ticket_id(self):
+        """Reserve the next ticket number.
+
+        This is synchronous, so two submissions handled at the same time on
+        the event loop can never be given the same number.
+        """
+        ticket_id = self._next_ticket_id
+        self._next_ticket_id += 1
+        with self.conn:
+            self.set_meta("next_ticket_id", self._next_ticket_id)
+        return ticket_id
+
+    def add_ticket(self, ticket_id, guild_id, creator_id, channel_id, subject, opened_at):
+        with self.conn:
+            self._insert_ticket(ticket_id, guild_id, creator_id, channel_id, subject, opened_at)
+        self._index_ticket({
+            "ticket_id": ticket_id,
+            "guild_id": guild_id,
+            "creator_id": _to_int(creator_id),
+            "channel_id": _to_int(channel_id),
+            "subject": subject,
+            "opened_at": opened_at,
+            "closed": False,
+            "closed_by": None,
+            "closed_at": None
+        })
+
+    def _ticket(self, where, params):
+        row = self.conn.execute(f"SELECT * FROM tickets WHERE {where} LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        ticket = dict(row)
+        ticket["closed"] = bool(ticket["closed"])
+        return ticket
+
+    def get_ticket(self, ticket_id):
+        if ticket_id in self._open_tickets:
+            return dict(self._open_tickets[ticket_id])
+        return self._ticket("ticket_id = ?", (ticket_id,))
+
+    def get_ticket_by_channel(self, channel_id):
+        ticket_id = self._open_by_channel.get(channel_id)
+        if ticket_id is not None:
+            return dict(self._open_tickets[ticket_id])
+        return self._ticket("channel_id = ?", (channel_id,))
+
+    def get_open_ticket(self, guild_id, creator_id):
+        ticket_id = self._open_by_creator.get((guild_id, creator_id))
+        if ticket_id is None:
+            return None
+        return dict(self._open_tickets[ticket_id])
+
+    def close_ticket(self, ticket_id, closed_by, closed_at):
+        ticket = self._open_tickets.get(ticket_id)
+        with self.conn:
+            cursor = self.conn.execute(
+                "UPDATE tickets SET closed = 1, closed_by = ?, closed_at = ? WHERE ticket_id = ? AND closed = 0",
+                (_to_int(closed_by), closed_at, ticket_id)
+            )
+            # Only count a ticket the first time it is closed
+            bucket = self._count_latency(ticket, closed_at) if ticket and cursor.rowcount else None
+        if bucket is not None:
+            histogram = self._latency.setdefault(ticket["guild_id"], {})
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        if ticket:
+            self._unindex_ticket(ticket)
+
+    def count_open_tickets(self, guild_id):
+        return sum(1 for ticket in self._open_tickets.values() if ticket["guild_id"] == guild_id)
+
+    def close_latency_histogram(self, guild_id):
+        """{bucket: tickets} of time-to-close in a guild, see stats.latency_bucket"""
+        return dict(self._latency.get(guild_id, {}))
+
+    def delete_closed_tickets(self, closed_before, max_ticket_id):
+        """Remove archived tickets from the live table. Returns the number removed."""
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM tickets WHERE closed = 1 AND closed_at < ? AND ticket_id <= ?",
+                (closed_before, max_ticket_id)
+            )
+        return cursor.rowcount
+
+    # Channel deletion queue
+
+    def add_channel_deletion(self, channel_id, ticket_id, reason, due_at):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO channel_deletions (channel_id, ticket_id, reason, due_at) "
+                "VALUES (?, ?, ?, ?)",
+                (channel_id, ticket_id, reason, due_at)
+            )
+        return self.get_channel_deletion(channel_id)
+
+    def get_channel_deletion(self, channel_id):
+        row = self.conn.execute("SELECT * FROM channel_deletions WHERE channel_id = ?", (channel_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_channel_deletions(self):
+        return [dict(row) for row in self.conn.execute("SELECT * FROM channel_deletions ORDER BY due_at")]
+
+    def retry_channel_deletion(self, channel_id, due_at, attempts, error):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE channel_deletions SET due_at = ?, attempts = ?, last_error = ? WHERE channel_id = ?",
+                (due_at, attempts, error, channel_id)
+            )
+
+    def remove_channel_deletion(self, channel_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM channel_deletions WHERE channel_id = ?", (channel_id,))
+
+    # Pre-created ticket channels
+
+    def add_spare_channel(self, channel_id, guild_id, created_at):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO spare_channels (channel_id, guild_id, created_at) VALUES (?, ?, ?)",
+                (channel_id, guild_id, created_at)
+            )
+
+    def remove_spare_channel(self, channel_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM spare_channels WHERE channel_id = ?", (channel_id,))
+
+    def list_spare_channels(self):
+        return [dict(row) for row in self.conn.execute("SELECT * FROM spare_channels ORDER BY created_at")]
+
+    # Timers
+
+    def add_timer(self, channel_id, message_id, author_id, author_name, started_at, ends_at):
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO timers (channel_id, message_id, author_id, author_name, started_at, ends_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (channel_id, message_id, author_id, author_name, started_at, ends_at)
+            )
+        return self.get_timer(cursor.lastrowid)
+
+    def get_timer(self, timer_id):
+        row = self.conn.execute("SELECT * FROM timers WHERE timer_id = ?", (timer_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_timers(self):
+        return [dict(row) for row in self.conn.execute("SELECT * FROM timers ORDER BY ends_at")]
+
+    def set_timer_phase(self, timer_id, phase):
+        with self.conn:
+            self.conn.execute("UPDATE timers SET phase = ? WHERE timer_id = ?", (phase, timer_id))
+
+    def delete_timer(self, timer_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM timers WHERE timer_id = ?", (timer_id,))
+
+    # DM conversations
+
+    def save_conversation(self, conversation):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO conversations (user_id, guild_id, flow, step, data, timeout, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    conversation["user_id"],
+                    conversation["guild_id"],
+                    conversation["flow"],
+                    conversation["step"],
+                    json.dumps(conversation["data"]),
+                    conversation["timeout"],
+                    conversation["expires_at"]
+                )
+            )
+
+    def delete_conversation(self, user_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM conversations WHERE user_id = ?", (user_id,))
+
+    def list_conversations(self):
+        conversations = []
+        for row in self.conn.execute("SELECT * FROM conversations"):
+            conversation = dict(row)
+            conversation["data"] = json.loads(conversation["data"] or "{}")
+            conversations.append(conversation)
+        return conversations
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import discord
+
+
+SPARE_CHANNEL_NAME = "ticket-spare"
+SPARE_CHANNEL_TOPIC = "Spare ticket channel, waiting to be used"
+
+
+class TicketChannelPool:
+    """Keeps a few hidden ticket channels ready in each guild.
+
+    Creating a channel is the slow part of opening a ticket. With a pool,
+    a new ticket claims a spare channel and turns it into the ticket with a
+    single edit (name, topic and permissions at once); the pool is then
+    topped up again in the background, one channel at a time.
+
+    ``size`` is the number of spares per guild; 0 disables the pool and
+    ``claim`` always returns None. Spare channels are stored in the
+    database so they are reused after a restart.
+    """
+
+    def __init__(self, storage, size=0):
+        self.storage = storage
+        self.size = size
+        self._spares = {}
+        self._refills = {}
+
+    def configure(self, config):
+        """Config listener: ``"ticket_pool": {"size": 3}``"""
+        self.size = max(0, int(config.get("ticket_pool", {}).get("size", 0)))
+
+    def load(self, bot):
+        """Pick up spare channels created before a restart, dropping ones that are gone"""
+        self._spares.clear()
+        for spare in self.storage.list_spare_channels():
+            channel = bot.get_channel(spare["channel_id"])
+            if channel is None:
+                self.storage.remove_spare_channel(spare["channel_id"])
+            else:
+                self._spares.setdefault(spare["guild_id"], []).append(channel.id)
+
+    def claim(self, guild):
+        """Take a spare channel out of the pool, or None if there isn't one"""
+        spares = self._spares.get(guild.id)
+        while spares:
+            channel_id = spares.pop(0)
+            self.storage.remove_spare_channel(channel_id)
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                return channel
+        return None
+
+    def release(self, channel):
+        """Put back a claimed channel that couldn't be turned into a ticket"""
+        if channel.guild.get_channel(channel.id) is None:
+            return  # Deleted in the meantime
+        spares = self._spares.setdefault(channel.guild.id, [])
+        if channel.id not in spares:
+            self.storage.add_spare_channel(channel.id, channel.guild.id, time.time())
+            spares.insert(0, channel.id)
+
+    def forget(self, channel_id, guild_id):
+        """A spare channel was deleted by someone else"""
+        spares = self._spares.get(guild_id)
+        if spares and channel_id in spares:
+            spares.remove(channel_id)
+            self.storage.remove_spare_channel(channel_id)
+
+    def refill(self, guild):
+        """Top the guild's pool up in the background (one refill per guild at a time)"""
+        if self.size <= 0:
+            return
+        task = self._refills.get(guild.id)
+        if task is None or task.done():
+            self._refills[guild.id] = asyncio.create_task(self._refill(guild))
+
+    async def _refill(self, guild):
+        spares = self._spares.setdefault(guild.id, [])
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            guild.me: discord.PermissionOverwrite(read_messages=True),
+        }
+        while len(spares) < self.size:
+            try:
+                channel = await guild.create_text_channel(
+                    name=SPARE_CHANNEL_NAME,
+                    overwrites=overwrites,
+                    topic=SPARE_CHANNEL_TOPIC,
+                    reason="Pre-creating a ticket channel"
+                )
+            except discord.HTTPException as e:
+                # Tickets fall back to creating their own channel until the next refill
+                print(f"Could not create a spare ticket channel in {guild}: {e}")
+                return
+            self.storage.add_spare_channel(channel.id, guild.id, time.time())
+            spares.append(channel.id)
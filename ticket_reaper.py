@@ -0,0 +1,184 @@
+import asyncio
+import datetime
+import gzip
+import itertools
+import json
+import os
+import sqlite3
+import time
+
+import discord
+
+from atomic_file import atomic_write
+from scheduling import DeadlineQueue
+from storage import select_closed_tickets
+
+
+def archive_closed_tickets(conn, directory, closed_before):
+    """Write tickets closed before ``closed_before`` to a new gzip JSONL archive.
+
+    Runs in a worker thread with its own connection. The archive is written
+    with ``atomic_write``, so a file on disk is never partial. Returns
+    ``(path, count, max_ticket_id)``; path is None when there was nothing
+    to archive.
+    """
+    rows = select_closed_tickets(conn, closed_before)
+    first = rows.fetchone()
+    if first is None:
+        return None, 0, 0
+
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(directory, f"tickets_{stamp}.jsonl.gz")
+    count = 0
+    max_ticket_id = 0
+    with atomic_write(path) as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            for row in itertools.chain([first], rows):
+                ticket = dict(row)
+                ticket["closed"] = bool(ticket["closed"])
+                f.write((json.dumps(ticket) + "\n").encode("utf-8"))
+                count += 1
+                max_ticket_id = max(max_ticket_id, ticket["ticket_id"])
+    return path, count, max_ticket_id
+
+
+class TicketReaper:
+    """Deletes closed ticket channels from a durable queue and archives old tickets.
+
+    Closing a ticket only queues its channel with ``schedule``; the queue is
+    stored in the database, so a restart before the deletion is due doesn't
+    leak the channel. One background loop deletes channels as they come
+    due and retries failures with exponential backoff. After
+    ``max_attempts`` failures the job stays in the database with its last
+    error and is tried again after the next restart.
+
+    If ``before_delete`` is given, ``await before_delete(channel, job)`` runs
+    first (e.g. to save a transcript); if it fails, the channel is kept and
+    the job retried like a failed deletion. On the last attempt the channel
+    is deleted even if ``before_delete`` still fails.
+
+    Every ``compact_interval`` seconds, tickets closed more than
+    ``archive_after_days`` ago are moved out of the live table into a
+    compressed archive file in ``archive_dir``.
+    """
+
+    def __init__(self, bot, storage, before_delete=None, max_attempts=5, retry_delay=30.0,
+                 archive_dir="archives", archive_after_days=30, compact_interval=6 * 3600):
+        self.bot = bot
+        self.storage = storage
+        self.before_delete = before_delete
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.archive_dir = archive_dir
+        self.archive_after_days = archive_after_days
+        self.compact_interval = compact_interval
+        self._queue = {}
+        self._deadlines = DeadlineQueue()
+        self._task = None
+        self._compact_task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if self.archive_after_days and (self._compact_task is None or self._compact_task.done()):
+            self._compact_task = asyncio.create_task(self._compact_periodically())
+
+    def _push(self, job):
+        self._queue[job["channel_id"]] = job
+        self._deadlines.push(job["due_at"], job["channel_id"])
+
+    def schedule(self, channel_id, ticket_id=None, reason=None, delay=10.0):
+        """Queue a channel for deletion in ``delay`` seconds"""
+        job = self.storage.add_channel_deletion(channel_id, ticket_id, reason, time.time() + delay)
+        self._push(job)
+        return job
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        for job in self.storage.list_channel_deletions():
+            if job["channel_id"] not in self._queue:
+                self._push(job)
+
+        while True:
+            due, channel_id = await self._deadlines.next()
+            job = self._queue.get(channel_id)
+            # Skip entries left behind by a retry or a reschedule
+            if job is None or job["due_at"] != due:
+                continue
+            try:
+                await self._reap(job)
+            except Exception as e:
+                # Keep the loop alive whatever goes wrong with one channel
+                print(f"Error deleting channel {channel_id}: {e!r}")
+                self._retry(job, e)
+
+    def _done(self, job):
+        self._queue.pop(job["channel_id"], None)
+        self.storage.remove_channel_deletion(job["channel_id"])
+
+    def _retry(self, job, error):
+        attempts = job["attempts"] + 1
+        job["attempts"] = attempts
+        job["last_error"] = str(error)
+        if attempts >= self.max_attempts:
+            # The row is kept, so the channel isn't forgotten while it still exists
+            self._queue.pop(job["channel_id"], None)
+            self.storage.retry_channel_deletion(job["channel_id"], job["due_at"], attempts, str(error))
+            print(f"Giving up deleting channel {job['channel_id']} after {attempts} attempts "
+                  f"until the next restart: {error}")
+            return
+        job["due_at"] = time.time() + self.retry_delay * 2 ** (attempts - 1)
+        self.storage.retry_channel_deletion(job["channel_id"], job["due_at"], attempts, str(error))
+        self._deadlines.push(job["due_at"], job["channel_id"])
+
+    async def _reap(self, job):
+        channel = self.bot.get_channel(job["channel_id"])
+        if channel is None:
+            self._done(job)  # Already gone
+            return
+
+        if self.before_delete:
+            try:
+                await self.before_delete(channel, job)
+            except Exception as e:
+                if job["attempts"] + 1 < self.max_attempts:
+                    self._retry(job, e)
+                    return
+                print(f"Deleting channel {job['channel_id']} without running before_delete, "
+                      f"which failed {job['attempts'] + 1} times: {e!r}")
+
+        try:
+            await channel.delete(reason=job["reason"])
+        except discord.NotFound:
+            pass
+        except discord.HTTPException as e:
+            self._retry(job, e)
+            return
+        self._done(job)
+
+    async def compact(self):
+        """Archive and drop tickets closed more than ``archive_after_days`` ago. Returns the count."""
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=self.archive_after_days)).isoformat()
+        reader = self.storage.open_reader()
+        try:
+            path, count, max_ticket_id = await asyncio.to_thread(
+                archive_closed_tickets, reader, self.archive_dir, cutoff
+            )
+        finally:
+            reader.close()
+        if not count:
+            return 0
+
+        # Only rows that made it into the archive are removed
+        removed = self.storage.delete_closed_tickets(cutoff, max_ticket_id)
+        print(f"Archived {count} closed tickets to {path} ({removed} removed from the live store)")
+        return removed
+
+    async def _compact_periodically(self):
+        while True:
+            try:
+                await self.compact()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Error archiving closed tickets: {e}")
+            await asyncio.sleep(self.compact_interval)
@@ -0,0 +1,151 @@
+import asyncio
+import datetime
+import time
+
+import discord
+
+from scheduling import DeadlineQueue
+
+
+# A timer only needs editing when its colour changes; the countdown itself is
+# a Discord relative timestamp that every client updates on its own.
+PHASE_RUNNING = 0
+PHASE_WARNING = 1   # 25% of the time left
+PHASE_CRITICAL = 2  # 10% of the time left
+PHASE_FINISHED = 3
+
+PHASE_THRESHOLDS = {
+    PHASE_RUNNING: 0.75,
+    PHASE_WARNING: 0.9,
+    PHASE_CRITICAL: 1.0,
+}
+
+
+def timer_phase(timer, now):
+    total = timer["ends_at"] - timer["started_at"]
+    if now >= timer["ends_at"] or total <= 0:
+        return PHASE_FINISHED
+    left = (timer["ends_at"] - now) / total
+    if left <= 0.1:
+        return PHASE_CRITICAL
+    if left <= 0.25:
+        return PHASE_WARNING
+    return PHASE_RUNNING
+
+
+def timer_embed(timer, phase):
+    started = datetime.datetime.fromtimestamp(timer["started_at"], tz=datetime.timezone.utc)
+    ends_at = int(timer["ends_at"])
+    if phase == PHASE_FINISHED:
+        embed = discord.Embed(
+            title="⏰ Time's Up!",
+            description="The timer has ended.",
+            color=discord.Color.red(),
+            timestamp=datetime.datetime.now(datetime.timezone.utc)
+        )
+    else:
+        colors = {
+            PHASE_RUNNING: discord.Color.blue(),
+            PHASE_WARNING: discord.Color.gold(),
+            PHASE_CRITICAL: discord.Color.red(),
+        }
+        embed = discord.Embed(
+            title="⏱️ Timer Started",
+            description=f"Time remaining: <t:{ends_at}:R>\nEnds at <t:{ends_at}:T>",
+            color=colors[phase],
+            timestamp=started
+        )
+    embed.set_footer(text=f"Timer requested by {timer['author_name']}")
+    return embed
+
+
+class TimerScheduler:
+    """Runs every countdown timer from one loop.
+
+    Timers are kept in a heap ordered by their next due time. The loop
+    sleeps until the earliest one, and a timer is only touched when its
+    phase changes (colour at 25% and 10% left, then finished), so ten
+    timers cost a handful of edits in total instead of ten per second.
+
+    Timers are stored in the database and picked up again after a
+    restart; ones that ended while the bot was offline fire right away.
+    """
+
+    def __init__(self, bot, storage):
+        self.bot = bot
+        self.storage = storage
+        self._timers = {}
+        self._deadlines = DeadlineQueue()
+        self._task = None
+        self._edits = set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _next_due(self, timer, now):
+        phase = timer_phase(timer, now)
+        if phase != timer["phase"]:
+            return now
+        total = timer["ends_at"] - timer["started_at"]
+        return timer["started_at"] + total * PHASE_THRESHOLDS[phase]
+
+    def _schedule(self, timer, now=None):
+        now = time.time() if now is None else now
+        self._timers[timer["timer_id"]] = timer
+        self._deadlines.push(self._next_due(timer, now), timer["timer_id"])
+
+    def add(self, channel_id, message_id, author_id, author_name, seconds):
+        """Store and schedule a new timer. Returns the timer dict."""
+        now = time.time()
+        timer = self.storage.add_timer(channel_id, message_id, author_id, author_name, now, now + seconds)
+        self._schedule(timer, now)
+        return timer
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        for timer in self.storage.list_timers():
+            if timer["timer_id"] not in self._timers:
+                self._schedule(timer)
+
+        while True:
+            _, timer_id = await self._deadlines.next()
+            timer = self._timers.get(timer_id)
+            if timer is None:
+                continue
+
+            now = time.time()
+            phase = timer_phase(timer, now)
+            timer["phase"] = phase
+            if phase == PHASE_FINISHED:
+                del self._timers[timer_id]
+                self.storage.delete_timer(timer_id)
+            else:
+                self.storage.set_timer_phase(timer_id, phase)
+                self._deadlines.push(self._next_due(timer, now), timer_id)
+
+            # Edits run on their own so a slow one can't delay other timers
+            task = asyncio.create_task(self._update_message(timer, phase))
+            self._edits.add(task)
+            task.add_done_callback(self._edits.discard)
+
+    async def _update_message(self, timer, phase):
+        channel = self.bot.get_channel(timer["channel_id"])
+        if channel is None:
+            self._drop(timer)
+            return
+
+        message = channel.get_partial_message(timer["message_id"])
+        try:
+            await message.edit(embed=timer_embed(timer, phase))
+            if phase == PHASE_FINISHED:
+                await channel.send(f"<@{timer['author_id']}> Your timer has finished!")
+        except discord.NotFound:
+            # The timer message was deleted; nothing left to update
+            self._drop(timer)
+        except discord.HTTPException as e:
+            print(f"Error updating timer {timer['timer_id']}: {e}")
+
+    def _drop(self, timer):
+        if self._timers.pop(timer["timer_id"], None) is not None:
+            self.storage.delete_timer(timer["timer_id"])
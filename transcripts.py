@@ -0,0 +1,110 @@
+import asyncio
+import gzip
+import html
+import json
+import os
+
+from atomic_file import atomic_write
+
+
+TRANSCRIPT_FORMATS = ("jsonl", "html")
+
+HTML_HEADER = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font-family: sans-serif; background: #313338; color: #dbdee1; }}
+.message {{ margin: 0.6em 0; }}
+.author {{ font-weight: bold; color: #f2f3f5; }}
+time {{ color: #949ba4; font-size: 0.8em; margin-left: 0.5em; }}
+.content {{ white-space: pre-wrap; }}
+a {{ color: #00a8fc; }}
+</style></head><body>
+<h1>{title}</h1>
+"""
+
+HTML_FOOTER = "<p>{count} messages</p>\n</body></html>\n"
+
+
+def message_record(message):
+    """What is kept of a message. Attachments are referenced by URL, not copied."""
+    return {
+        "id": message.id,
+        "author_id": message.author.id,
+        "author": str(message.author),
+        "created_at": message.created_at.isoformat(),
+        "edited_at": message.edited_at.isoformat() if message.edited_at else None,
+        "content": message.content,
+        "attachments": [
+            {
+                "filename": attachment.filename,
+                "url": attachment.url,
+                "size": attachment.size,
+                "content_type": attachment.content_type,
+            }
+            for attachment in message.attachments
+        ],
+        "embeds": [embed.to_dict() for embed in message.embeds],
+        "reply_to": message.reference.message_id if message.reference else None,
+    }
+
+
+def _jsonl_line(record):
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _html_block(record):
+    lines = [
+        '<div class="message">',
+        f'<span class="author">{html.escape(record["author"])}</span>'
+        f'<time>{html.escape(record["created_at"])}</time>',
+    ]
+    if record["content"]:
+        lines.append(f'<div class="content">{html.escape(record["content"])}</div>')
+    for embed in record["embeds"]:
+        title = embed.get("title") or embed.get("description") or "embed"
+        lines.append(f'<div class="content">[{html.escape(title[:200])}]</div>')
+    for attachment in record["attachments"]:
+        lines.append(
+            f'<div><a href="{html.escape(attachment["url"], quote=True)}">'
+            f'{html.escape(attachment["filename"])}</a></div>'
+        )
+    lines.append("</div>\n")
+    return "\n".join(lines)
+
+
+async def write_transcript(channel, directory, basename, fmt="jsonl", batch_size=100):
+    """Write a channel's history to ``directory/basename.<fmt>.gz``, oldest message first.
+
+    History is paged through asynchronously and written a batch at a time
+    (compression runs in a worker thread), so memory stays bounded however
+    long the ticket is. The file appears under its final name only once it
+    is complete. Returns ``(path, message_count)``.
+    """
+    if fmt not in TRANSCRIPT_FORMATS:
+        raise ValueError(f"Unknown transcript format `{fmt}`")
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{basename}.{fmt}.gz")
+    count = 0
+    with atomic_write(path) as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+
+            def write(text):
+                f.write(text.encode("utf-8"))
+
+            if fmt == "html":
+                await asyncio.to_thread(write, HTML_HEADER.format(title=html.escape(f"#{channel.name}")))
+
+            batch = []
+            async for message in channel.history(limit=None, oldest_first=True):
+                record = message_record(message)
+                batch.append(_html_block(record) if fmt == "html" else _jsonl_line(record))
+                count += 1
+                if len(batch) >= batch_size:
+                    await asyncio.to_thread(write, "".join(batch))
+                    batch = []
+            if fmt == "html":
+                batch.append(HTML_FOOTER.format(count=count))
+            if batch:
+                await asyncio.to_thread(write, "".join(batch))
+    return path, count
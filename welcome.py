@@ -0,0 +1,294 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKGROUND_PATH = os.path.join(ASSET_DIR, "welcome_background.png")  # Save your background image with this name
+TITLE_FONT_PATH = os.path.join(ASSET_DIR, "RobotoSlab-Regular.ttf")
+SUBTITLE_FONT_PATH = "arial.ttf"
+AVATAR_SIZE = (200, 200)
+AVATAR_POSITION = (740, 150)
+COLLAGE_COLUMNS = 5
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class WelcomeTemplates:
+    """Caches everything in the welcome card that doesn't depend on the member.
+
+    The decoded background, the fonts, the avatar mask and a per-guild copy
+    of the background with the "Welcome to ..." title already drawn are
+    built once. A render then only copies the guild layer and draws the
+    member name and avatar. Everything is rebuilt when the background or
+    font files change, and a guild's layer is redrawn when it is renamed.
+
+    Each worker process gets its own instance; in thread mode the renders
+    share one, guarded by a lock.
+    """
+
+    def __init__(self, max_guilds=64):
+        self.max_guilds = max_guilds
+        self._lock = threading.Lock()
+        self._asset_key = None
+        self._background = None
+        self._title_font = None
+        self._subtitle_font = None
+        self._guild_layers = {}  # guild_id -> (guild_name, image)
+        self._mask = None
+
+    def _load_font(self, paths, size):
+        for path in paths:
+            try:
+                return ImageFont.truetype(path, size)
+            except IOError:
+                continue
+        return ImageFont.load_default()
+
+    def _load_assets(self):
+        try:
+            background = Image.open(BACKGROUND_PATH)
+            background.load()
+        except FileNotFoundError:
+            # Create a simple background if image doesn't exist
+            background = Image.new('RGB', (800, 300), color=(54, 57, 63))
+
+        self._background = background
+        self._title_font = self._load_font([TITLE_FONT_PATH], 55)
+        self._subtitle_font = self._load_font([SUBTITLE_FONT_PATH, TITLE_FONT_PATH], 40)
+        self._name_font = self._load_font([SUBTITLE_FONT_PATH, TITLE_FONT_PATH], 24)
+        self._guild_layers.clear()
+
+        # Make avatar circular
+        mask = Image.new('L', AVATAR_SIZE, 0)
+        ImageDraw.Draw(mask).ellipse((0, 0) + AVATAR_SIZE, fill=255)
+        self._mask = mask
+
+    def _check_assets(self):
+        asset_key = (_mtime(BACKGROUND_PATH), _mtime(TITLE_FONT_PATH))
+        if asset_key != self._asset_key:
+            self._load_assets()
+            self._asset_key = asset_key
+
+    def collage_assets(self):
+        """Return (title_font, name_font, avatar_mask) for batch welcome images"""
+        with self._lock:
+            self._check_assets()
+            return self._title_font, self._name_font, self._mask
+
+    def get(self, guild_id, guild_name):
+        """Return (base_image, subtitle_font, avatar_mask); the base image is a fresh copy"""
+        with self._lock:
+            self._check_assets()
+
+            cached = self._guild_layers.get(guild_id)
+            if cached is None or cached[0] != guild_name:
+                layer = self._background.copy()
+                draw = ImageDraw.Draw(layer)
+                draw.text((350, 220), f"Welcome to {guild_name}", fill=(0, 0, 0), font=self._title_font, anchor="mm")
+
+                if len(self._guild_layers) >= self.max_guilds:
+                    self._guild_layers.pop(next(iter(self._guild_layers)))
+                cached = (guild_name, layer)
+                self._guild_layers[guild_id] = cached
+
+            return cached[1].copy(), self._subtitle_font, self._mask
+
+
+templates = WelcomeTemplates()
+
+
+def prepare_avatar_tile(avatar_bytes):
+    """Decode and resize downloaded avatar bytes into a tile ready to paste"""
+    with Image.open(BytesIO(avatar_bytes)) as avatar:
+        return avatar.convert("RGBA").resize(AVATAR_SIZE)
+
+
+def render_welcome_image(guild_id, guild_name, member_name, avatar_tile=None):
+    """Render the welcome card and return (png_bytes, seconds_spent).
+
+    This is plain blocking PIL code; it runs inside the renderer's pool,
+    never on the event loop. It only takes picklable arguments so it can be
+    used with a process pool too.
+    """
+    started = time.perf_counter()
+
+    img, subtitle_font, mask = templates.get(guild_id, guild_name)
+    draw = ImageDraw.Draw(img)
+    draw.text((295, 290), f"{member_name}", fill=(43, 117, 156), font=subtitle_font, anchor="mm")
+
+    # Position avatar on right side
+    if avatar_tile is not None:
+        img.paste(avatar_tile, AVATAR_POSITION, mask)
+
+    # Save to buffer
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+
+    return buffer.getvalue(), time.perf_counter() - started
+
+
+def render_welcome_collage(guild_id, guild_name, members):
+    """Render one image welcoming several members and return (png_bytes, seconds_spent).
+
+    ``members`` is a list of (member_name, avatar_tile) pairs, laid out as a
+    grid of avatars with names underneath.
+    """
+    started = time.perf_counter()
+    title_font, name_font, mask = templates.collage_assets()
+
+    columns = min(COLLAGE_COLUMNS, len(members))
+    rows = math.ceil(len(members) / columns)
+    cell_width = AVATAR_SIZE[0] + 40
+    cell_height = AVATAR_SIZE[1] + 60
+    header = 100
+    img = Image.new('RGB', (columns * cell_width + 40, header + rows * cell_height + 20), color=(54, 57, 63))
+    draw = ImageDraw.Draw(img)
+    draw.text((img.width // 2, header // 2), f"Welcome to {guild_name}", fill=(255, 255, 255), font=title_font, anchor="mm")
+
+    for index, (member_name, avatar_tile) in enumerate(members):
+        row, column = divmod(index, columns)
+        x = 20 + column * cell_width + 20
+        y = header + row * cell_height
+        if avatar_tile is not None:
+            img.paste(avatar_tile, (x, y), mask)
+        else:
+            draw.ellipse((x, y, x + AVATAR_SIZE[0], y + AVATAR_SIZE[1]), fill=(88, 101, 242))
+        name = member_name if len(member_name) <= 16 else member_name[:15] + "…"
+        draw.text((x + AVATAR_SIZE[0] // 2, y + AVATAR_SIZE[1] + 25), name, fill=(255, 255, 255), font=name_font, anchor="mm")
+
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+
+    return buffer.getvalue(), time.perf_counter() - started
+
+
+class WelcomeRenderer:
+    """Runs welcome image rendering in a thread or process pool.
+
+    At most ``max_pending`` renders can be queued or running; further
+    callers wait for a slot instead of piling work onto the pool, which
+    keeps memory bounded during join bursts.
+    """
+
+    def __init__(self, mode="thread", workers=None, max_pending=64):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown render mode: {mode}")
+        if mode == "process" and "fork" not in multiprocessing.get_all_start_methods():
+            print("Rendering welcome images in processes needs the fork start method, using threads")
+            mode = "thread"
+
+        if mode == "process":
+            # Forked workers don't re-import the bot's main module (and rerun
+            # its setup) the way spawn and forkserver workers do. They are
+            # started now, while the bot is still single-threaded.
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+            self.executor.submit(int).result()
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="welcome-render")
+        self.mode = mode
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_pending)
+        self.rendered = 0
+        self.total_render_time = 0.0
+        self.max_render_time = 0.0
+
+    async def prepare_avatar(self, avatar_bytes):
+        """Decode and resize an avatar in the pool; returns None if it can't be decoded"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, prepare_avatar_tile, avatar_bytes)
+        except Exception as e:
+            print(f"Error adding avatar: {e}")
+            return None
+
+    async def _run(self, label, func, *args):
+        queued_at = time.perf_counter()
+        async with self._slots:
+            waited = time.perf_counter() - queued_at
+            loop = asyncio.get_running_loop()
+            png, render_time = await loop.run_in_executor(self.executor, func, *args)
+
+        self.rendered += 1
+        self.total_render_time += render_time
+        self.max_render_time = max(self.max_render_time, render_time)
+        print(f"Rendered welcome image for {label} in {render_time * 1000:.0f} ms (queued {waited * 1000:.0f} ms)")
+        return png
+
+    async def render(self, guild_id, guild_name, member_name, avatar_tile=None):
+        """Render a welcome card off the event loop and return the PNG bytes"""
+        return await self._run(member_name, render_welcome_image, guild_id, guild_name, member_name, avatar_tile)
+
+    async def render_collage(self, guild_id, guild_name, members):
+        """Render a batch welcome image for (member_name, avatar_tile) pairs"""
+        return await self._run(f"{len(members)} members", render_welcome_collage, guild_id, guild_name, members)
+
+    def stats(self):
+        average = self.total_render_time / self.rendered if self.rendered else 0.0
+        return {
+            "mode": self.mode,
+            "rendered": self.rendered,
+            "average_ms": round(average * 1000, 1),
+            "max_ms": round(self.max_render_time * 1000, 1),
+        }
+
+    def shutdown(self):
+        # Drop queued renders; only the ones already running are waited for
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class JoinCoalescer:
+    """Groups joins that arrive close together into one welcome message.
+
+    The first join for a key (a guild) opens a window of ``window`` seconds;
+    everything that arrives before it closes, or until ``max_batch`` members
+    are waiting, is handed to ``send_batch(key, members)`` in one call.
+    """
+
+    def __init__(self, send_batch, window=2.0, max_batch=25):
+        self.send_batch = send_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+
+    def add(self, key, member):
+        batch = self._pending.setdefault(key, [])
+        batch.append(member)
+
+        if len(batch) >= self.max_batch or self.window <= 0:
+            self._flush(key)
+        elif key not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._send(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, key, batch):
+        try:
+            await self.send_batch(key, batch)
+        except Exception as e:
+            print(f"Error sending welcome message for {len(batch)} members: {e}")